@@ -0,0 +1,221 @@
+# app/admission.py
+"""
+Контроль допуска для /search.
+Число одновременно выполняемых поисков ограничено адаптивным лимитом (AIMD):
+пока задержка ниже цели, лимит растёт на 1/limit за запрос, при признаках
+перегрузки — умножается на backoff. Цель — tolerance × базовая задержка
+(скользящее среднее полных ответов), а не фиксированное число: обычная задержка
+поиска сама по себе лимит не снижает. Перегрузка — это задержка выше цели,
+ConnectionTimeout кластера или частичный ответ при бюджете не меньше
+стандартного; короткий budget_ms, выбранный клиентом, лимит не трогает.
+Сверх лимита запросы ждут
+в ограниченной очереди; если очередь полна или ожидание дольше допустимого,
+запрос сразу получает 503 с Retry-After, а не висит до общего таймаута.
+"""
+
+import asyncio
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Optional
+
+from opensearchpy.exceptions import ConnectionTimeout
+
+from app.config import settings
+from app.deadline import current_deadline
+from app.latency import LatencyStats
+
+
+class Overloaded(Exception):
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(f"overloaded: {reason}")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdaptiveLimiter:
+    def __init__(self, initial_limit: int, min_limit: int, max_limit: int, max_queue: int,
+                 queue_timeout: float, target_latency: Optional[float] = None,
+                 latency_tolerance: float = 2.0, baseline_window: int = 500, backoff: float = 0.9):
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        # target_latency=None — цель считается от измеренной задержки
+        self.target_latency = target_latency
+        self.latency_tolerance = latency_tolerance
+        self.baseline_window = baseline_window
+        self.backoff = backoff
+        self.baseline_latency: Optional[float] = None
+        self._baseline_samples = 0
+
+        self.in_flight = 0
+        self._queue: deque[asyncio.Future] = deque()
+        self.admitted = 0
+        self.rejected: dict[str, int] = {}
+        self.wait_time = LatencyStats()
+        self.latency = LatencyStats()
+
+    def _has_capacity(self) -> bool:
+        return self.in_flight < max(1, int(self.limit))
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._queue)
+
+    @property
+    def saturated(self) -> bool:
+        return not self._has_capacity()
+
+    def target(self) -> Optional[float]:
+        """Порог задержки для backoff; None, пока нет ни одного замера"""
+        if self.target_latency is not None:
+            return self.target_latency
+        if self.baseline_latency is None:
+            return None
+        return self.baseline_latency * self.latency_tolerance
+
+    def _observe_baseline(self, latency: float):
+        # Первые baseline_window замеров — обычное среднее, дальше экспоненциальное
+        self._baseline_samples += 1
+        alpha = max(1 / self.baseline_window, 1 / self._baseline_samples)
+        if self.baseline_latency is None:
+            self.baseline_latency = latency
+        else:
+            self.baseline_latency += alpha * (latency - self.baseline_latency)
+
+    def retry_after(self) -> int:
+        """Оценка в секундах: сколько «поколений» лимита нужно, чтобы разобрать очередь"""
+        per_request = self.latency.percentile(50) or self.target() or 1.0
+        return max(1, math.ceil((len(self._queue) / max(self.limit, 1.0) + 1) * per_request))
+
+    def _reject(self, reason: str):
+        self.rejected[reason] = self.rejected.get(reason, 0) + 1
+        raise Overloaded(reason, self.retry_after())
+
+    async def acquire(self):
+        start = time.monotonic()
+        if not self._queue and self._has_capacity():
+            self.in_flight += 1
+        else:
+            if len(self._queue) >= self.max_queue:
+                self._reject("queue_full")
+
+            # Ждать дольше остатка бюджета запроса бессмысленно
+            timeout = self.queue_timeout
+            deadline = current_deadline.get()
+            if deadline is not None:
+                timeout = min(timeout, deadline.remaining())
+
+            waiter = asyncio.get_running_loop().create_future()
+            self._queue.append(waiter)
+            try:
+                # слот передаётся в release(): in_flight уже увеличен за нас
+                await asyncio.wait_for(waiter, timeout)
+            except asyncio.TimeoutError:
+                if waiter in self._queue:
+                    self._queue.remove(waiter)
+                elif waiter.done() and not waiter.cancelled():
+                    # release() выдал слот в момент таймаута — возвращаем его
+                    self.release(None, ok=True)
+                self._reject("queue_timeout")
+            except asyncio.CancelledError:
+                if waiter in self._queue:
+                    self._queue.remove(waiter)
+                elif waiter.done() and not waiter.cancelled():
+                    # слот уже выдан, но ждать его некому — возвращаем
+                    self.release(None, ok=True)
+                raise
+        self.admitted += 1
+        self.wait_time.observe(time.monotonic() - start)
+
+    def release(self, latency, ok: bool):
+        """latency=None — слот возвращается без изменения лимита;
+        ok=False — запрос завершился с признаком перегрузки"""
+        self.in_flight -= 1
+        if latency is not None:
+            self.latency.observe(latency)
+            target = self.target()
+            if ok:
+                self._observe_baseline(latency)
+            if not ok or (target is not None and latency > target):
+                self.limit = max(self.min_limit, self.limit * self.backoff)
+            elif self.in_flight + 1 >= int(self.limit):
+                # растём, только когда лимит реально упирался
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+
+        while self._queue and self._has_capacity():
+            waiter = self._queue.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
+
+    @asynccontextmanager
+    async def slot(self):
+        await self.acquire()
+        start = time.monotonic()
+        try:
+            yield
+        except (asyncio.TimeoutError, ConnectionTimeout):
+            deadline = current_deadline.get()
+            if deadline is not None and not _default_budget(deadline):
+                # таймаут клиента урезан коротким budget_ms — о кластере ничего не говорит
+                self.release(None, ok=True)
+            else:
+                # таймаут запроса к кластеру — признак перегрузки
+                self.release(time.monotonic() - start, ok=False)
+            raise
+        except BaseException:
+            # отмена (клиент отключился) или ошибка запроса — о нагрузке ничего не говорят
+            self.release(None, ok=True)
+            raise
+        deadline = current_deadline.get()
+        if deadline is not None and deadline.partial and not _default_budget(deadline):
+            # клиент сам выбрал короткий бюджет: ни перегрузки, ни полезного замера задержки
+            self.release(None, ok=True)
+        else:
+            # ответ по частям на полном бюджете — признак перегрузки кластера
+            self.release(time.monotonic() - start, ok=deadline is None or not deadline.partial)
+
+    def stats(self) -> dict:
+        return {
+            "limit": round(self.limit, 2),
+            "in_flight": self.in_flight,
+            "target_latency": round(self.target(), 4) if self.target() is not None else None,
+            "baseline_latency": round(self.baseline_latency, 4) if self.baseline_latency is not None else None,
+            "queue_depth": len(self._queue),
+            "admitted": self.admitted,
+            "rejected": dict(self.rejected),
+            "wait_time": self.wait_time.stats(),
+            "latency": self.latency.stats(),
+        }
+
+
+def _default_budget(deadline) -> bool:
+    """Запрос шёл со стандартным бюджетом или больше: его частичный ответ говорит о перегрузке,
+    а короткий budget_ms клиента кончается и на здоровом кластере"""
+    return deadline.budget >= settings.search_budget_ms / 1000
+
+
+search_limiter = AdaptiveLimiter(
+    initial_limit=settings.admission_initial_limit,
+    min_limit=settings.admission_min_limit,
+    max_limit=settings.admission_max_limit,
+    max_queue=settings.admission_max_queue,
+    queue_timeout=settings.admission_queue_timeout,
+    target_latency=settings.admission_target_latency,
+    latency_tolerance=settings.admission_latency_tolerance,
+    baseline_window=settings.admission_baseline_window,
+)
+
+
+@asynccontextmanager
+async def admitted():
+    """Слот search_limiter или сразу, если контроль допуска выключен"""
+    if not settings.admission_enabled:
+        yield
+        return
+    async with search_limiter.slot():
+        yield
@@ -0,0 +1,60 @@
+"""
+Заполняет cover_page и page_count у уже загруженных книг.
+Нужен один раз для индексов, созданных до появления этих полей:
+поиск больше не запрашивает pages, поэтому без них карточки останутся без обложки.
+Использование: python -m app.backfill_cover_pages [index]
+"""
+
+import sys
+from app.opensearch_client import client
+from app.logger_config import setup_logger
+
+logger = setup_logger("backfill_cover_pages")
+
+# Та же логика, что и в pick_cover_page: приоритетная страница → любая с картинкой
+COVER_SCRIPT = """
+def pages = ctx._source.pages;
+if (pages == null) {
+    pages = [];
+}
+def cover = null;
+for (p in pages) {
+    if (p.cover_book_page != null && p.cover_book_page == 1) { cover = p; break; }
+}
+if (cover == null) {
+    for (p in pages) {
+        if (p.book_page_image != null && p.book_page_image != '') { cover = p; break; }
+    }
+}
+ctx._source.page_count = pages.size();
+ctx._source.cover_page = cover == null ? null : ['page': cover.book_page, 'image': cover.book_page_image];
+"""
+
+COVER_MAPPING = {
+    "properties": {
+        "cover_page": {
+            "properties": {
+                "page": {"type": "long"},
+                "image": {"type": "keyword", "index": False}
+            }
+        },
+        "page_count": {"type": "integer"}
+    }
+}
+
+
+def backfill(index: str = "my-books-index") -> dict:
+    client.indices.put_mapping(index=index, body=COVER_MAPPING)
+    resp = client.update_by_query(
+        index=index,
+        body={"script": {"source": COVER_SCRIPT, "lang": "painless"}},
+        conflicts="proceed",
+        wait_for_completion=True,
+        request_timeout=3600
+    )
+    logger.info(f"✅ cover_page/page_count обновлены: updated={resp.get('updated')}, failures={len(resp.get('failures', []))}")
+    return resp
+
+
+if __name__ == "__main__":
+    backfill(*sys.argv[1:2])
@@ -1,4 +1,47 @@
-def build_flat_query(query_list: list[str], start_year: str = None, end_year: str = None) -> dict:
+# Подполя с нормализацией транслитерации и раскладки (см. index_body._text_with_variants)
+VARIANT_SUBFIELDS = ("translit", "layout")
+VARIANT_SUBFIELD_BOOST_FACTOR = 0.5
+
+SEARCH_SOURCE_FIELDS = [
+    "book_id",
+    "title",
+    "book_name",
+    "description",
+    "referat",
+    "book_year",
+    "lang",
+    "filter_name",
+    "path_index",
+    "pdf_url",
+    "pdf_opac_001",
+    # вместо полного массива pages (с OCR-текстом) — предрассчитанные поля
+    "cover_page",
+    "page_count",
+    "book_code"
+]
+
+# Множители по matched_by (бывший merge_hits) и бонусы postprocess_hits для серверного ранжирования
+MATCHED_BY_WEIGHTS = {"both": 1.6, "nested": 1.4, "flat_high": 1.2, "flat_low": 0.9}
+FLAT_HIGH_SCORE_THRESHOLD = 200
+TITLE_MULTI_WORD_BONUS = 80.0
+TITLE_SINGLE_WORD_BONUS = 30.0
+PAGE_MULTI_WORD_BONUS = 100.0
+PAGE_SINGLE_WORD_BONUS = 40.0
+
+
+def with_variant_subfields(fields: list[str], variant_fields: set[str]) -> list[str]:
+    """Добавляет к полям из variant_fields их подполя translit/layout с пониженным бустом"""
+    result = list(fields)
+    for field in fields:
+        name, _, boost = field.partition("^")
+        if name not in variant_fields:
+            continue
+        sub_boost = float(boost or 1) * VARIANT_SUBFIELD_BOOST_FACTOR
+        result.extend(f"{name}.{sub}^{sub_boost:g}" for sub in VARIANT_SUBFIELDS)
+    return result
+
+
+def build_flat_query(query_list: list[str], start_year: str = None, end_year: str = None, use_subfields: bool = False, size: int = 50) -> dict:
     must_filters = []
     if start_year and end_year:
         must_filters.append({
@@ -11,84 +54,17 @@ def build_flat_query(query_list: list[str], start_year: str = None, end_year: st
         })
 
     joined_query = " ".join(query_list)
+    variant_fields = {"title", "book_name"} if use_subfields else set()
 
     return {
-        "size": 50,
+        "size": size,
         # Вот тут важный фикс:
-        "_source": [
-            "book_id",
-            "title",
-            "book_name",
-            "description",
-            "referat",
-            "book_year",
-            "lang",
-            "filter_name",
-            "path_index",
-            "pdf_url",
-            "pdf_opac_001",
-            "pages",
-            "book_code"
-        ],
+        "_source": SEARCH_SOURCE_FIELDS,
 
         "query": {
             "bool": {
                 "must": must_filters,
-                        "should": [
-            # Точное фразовое совпадение в заголовке - максимальный буст только если ВСЕ слова есть
-            {
-                "multi_match": {
-                    "query": joined_query,
-                    "fields": [
-                        "title^25",
-                        "book_name^25"
-                    ],
-                    "type": "phrase",
-                    "boost": 10.0
-                }
-            },
-            # Все слова должны присутствовать в заголовке (AND)
-            {
-                "multi_match": {
-                    "query": joined_query,
-                    "fields": [
-                        "title^15",
-                        "book_name^15"
-                    ],
-                    "type": "best_fields",
-                    "operator": "and",
-                    "boost": 5.0
-                }
-            },
-            # Все слова должны присутствовать где-то в документе
-            {
-                "multi_match": {
-                    "query": joined_query,
-                    "fields": [
-                        "title^8",
-                        "book_name^8",
-                        "description^4"
-                    ],
-                    "type": "cross_fields",
-                    "operator": "and",
-                    "boost": 3.0
-                }
-            },
-            # Частичное совпадение в заголовках (с пониженным бустом)
-            {
-                "multi_match": {
-                    "query": joined_query,
-                    "fields": [
-                        "title^4",
-                        "book_name^4",
-                        "description^2"
-                    ],
-                    "type": "best_fields",
-                    "operator": "or",
-                    "boost": 1.0
-                }
-            }
-        ],
+                "should": build_title_clauses(joined_query, variant_fields),
                 "minimum_should_match": 1
             }
         },
@@ -104,7 +80,68 @@ def build_flat_query(query_list: list[str], start_year: str = None, end_year: st
     }
 
 
-def build_nested_query(query_list: list[str], start_year: str = None, end_year: str = None) -> dict:
+def build_title_clauses(joined_query: str, variant_fields: set[str]) -> list[dict]:
+    """Совпадения в заголовке и описании (flat-часть поиска)"""
+    return [
+        # Точное фразовое совпадение в заголовке - максимальный буст только если ВСЕ слова есть
+        {
+            "multi_match": {
+                "query": joined_query,
+                "fields": with_variant_subfields([
+                    "title^25",
+                    "book_name^25"
+                ], variant_fields),
+                "type": "phrase",
+                "boost": 10.0,
+                # по matched_queries каскадный поиск видит точное совпадение фразы
+                "_name": "title_phrase"
+            }
+        },
+        # Все слова должны присутствовать в заголовке (AND)
+        {
+            "multi_match": {
+                "query": joined_query,
+                "fields": with_variant_subfields([
+                    "title^15",
+                    "book_name^15"
+                ], variant_fields),
+                "type": "best_fields",
+                "operator": "and",
+                "boost": 5.0
+            }
+        },
+        # Все слова должны присутствовать где-то в документе
+        {
+            "multi_match": {
+                "query": joined_query,
+                "fields": with_variant_subfields([
+                    "title^8",
+                    "book_name^8",
+                    "description^4"
+                ], variant_fields),
+                "type": "cross_fields",
+                "operator": "and",
+                "boost": 3.0
+            }
+        },
+        # Частичное совпадение в заголовках (с пониженным бустом)
+        {
+            "multi_match": {
+                "query": joined_query,
+                "fields": with_variant_subfields([
+                    "title^4",
+                    "book_name^4",
+                    "description^2"
+                ], variant_fields),
+                "type": "best_fields",
+                "operator": "or",
+                "boost": 1.0
+            }
+        }
+    ]
+
+
+def build_nested_query(query_list: list[str], start_year: str = None, end_year: str = None, use_subfields: bool = False, size: int = 50, inner_hits: bool = True) -> dict:
     must_filters = []
     if start_year and end_year:
         must_filters.append({
@@ -117,25 +154,12 @@ def build_nested_query(query_list: list[str], start_year: str = None, end_year:
         })
 
     joined_query = " ".join(query_list)
+    variant_fields = {"pages.book_page_text"} if use_subfields else set()
 
     return {
-        "size": 50,
+        "size": size,
         # Вот тут важный фикс:
-        "_source": [
-            "book_id",
-            "title",
-            "book_name",
-            "description",
-            "referat",
-            "book_year",
-            "lang",
-            "filter_name",
-            "path_index",
-            "pdf_url",
-            "pdf_opac_001",
-            "pages",
-            "book_code"
-        ],
+        "_source": SEARCH_SOURCE_FIELDS,
 
         "query": {
             "bool": {
@@ -144,42 +168,10 @@ def build_nested_query(query_list: list[str], start_year: str = None, end_year:
                     {
                         "nested": {
                             "path": "pages",
-                            "query": {
-                                "bool": {
-                                    "should": [
-                                        # Точная фраза в тексте - максимальный буст
-                                        {
-                                            "multi_match": {
-                                                "query": joined_query,
-                                                "fields": ["pages.book_page_text^15"],
-                                                "type": "phrase",
-                                                "boost": 3.0
-                                            }
-                                        },
-                                        # Все слова должны быть в тексте страницы
-                                        {
-                                            "multi_match": {
-                                                "query": joined_query,
-                                                "fields": ["pages.book_page_text^10"],
-                                                "type": "best_fields",
-                                                "operator": "and",
-                                                "boost": 2.0
-                                            }
-                                        },
-                                        # Частичное совпадение в тексте
-                                        {
-                                            "multi_match": {
-                                                "query": joined_query,
-                                                "fields": ["pages.book_page_text^5"],
-                                                "type": "best_fields",
-                                                "operator": "or"
-                                            }
-                                        }
-                                    ],
-                                    "minimum_should_match": 1
-                                }
-                            },
-                            "inner_hits": {
+                            "query": build_page_text_query(joined_query, variant_fields),
+                            # inner_hits с подсветкой — самая дорогая часть поиска;
+                            # при ленивой загрузке страниц их берёт build_book_pages_query
+                            **({"inner_hits": {
                                 "name": "matched_pages",
                                 "size": 5,
                                 "highlight": {
@@ -189,7 +181,7 @@ def build_nested_query(query_list: list[str], start_year: str = None, end_year:
                                     "number_of_fragments": 1,
                                     "fragment_size": 150
                                 }
-                            }
+                            }} if inner_hits else {})
                         }
                     }
                 ],
@@ -197,3 +189,217 @@ def build_nested_query(query_list: list[str], start_year: str = None, end_year:
             }
         }
     }
+
+
+def build_page_text_query(joined_query: str, variant_fields: set[str]) -> dict:
+    """Запрос к тексту страницы внутри nested pages"""
+    return {
+        "bool": {
+            "should": [
+                # Точная фраза в тексте - максимальный буст
+                {
+                    "multi_match": {
+                        "query": joined_query,
+                        "fields": with_variant_subfields(["pages.book_page_text^15"], variant_fields),
+                        "type": "phrase",
+                        "boost": 3.0
+                    }
+                },
+                # Все слова должны быть в тексте страницы
+                {
+                    "multi_match": {
+                        "query": joined_query,
+                        "fields": with_variant_subfields(["pages.book_page_text^10"], variant_fields),
+                        "type": "best_fields",
+                        "operator": "and",
+                        "boost": 2.0
+                    }
+                },
+                # Частичное совпадение в тексте
+                {
+                    "multi_match": {
+                        "query": joined_query,
+                        "fields": with_variant_subfields(["pages.book_page_text^5"], variant_fields),
+                        "type": "best_fields",
+                        "operator": "or"
+                    }
+                }
+            ],
+            "minimum_should_match": 1
+        }
+    }
+
+
+def build_book_pages_query(query_list: list[str], doc_id: str, page: int = 1, page_size: int = 5, use_subfields: bool = False) -> dict:
+    """Совпавшие страницы одной книги с подсветкой, постранично (для раскрытия карточки)"""
+    joined_query = " ".join(query_list)
+    variant_fields = {"pages.book_page_text"} if use_subfields else set()
+
+    return {
+        "size": 1,
+        "_source": False,
+        "query": {
+            "bool": {
+                "filter": [{"ids": {"values": [doc_id]}}],
+                "must": [
+                    {
+                        "nested": {
+                            "path": "pages",
+                            "query": build_page_text_query(joined_query, variant_fields),
+                            "inner_hits": {
+                                "name": "matched_pages",
+                                "from": (page - 1) * page_size,
+                                "size": page_size,
+                                "_source": ["pages.book_page", "pages.book_page_image"],
+                                "highlight": {
+                                    "fields": {
+                                        "pages.book_page_text": {"no_match_size": 150}
+                                    },
+                                    "number_of_fragments": 1,
+                                    "fragment_size": 150
+                                }
+                            }
+                        }
+                    }
+                ]
+            }
+        }
+    }
+
+
+def build_combined_query(query_list: list[str], start_year: str = None, end_year: str = None, use_subfields: bool = False,
+                         size: int = 30, inner_hits: bool = True, rescore_window: int = 100,
+                         search_mode: str = "both", rescore: bool = True) -> dict:
+    """Один запрос вместо flat + nested с ранжированием на стороне OpenSearch.
+
+    function_score повторяет множители merge_hits по matched_by,
+    rescore добавляет бонусы postprocess_hits за совпадения слов в заголовке
+    и в тексте лучшей страницы, поэтому OpenSearch сразу отдаёт итоговый top-N.
+    Какая часть совпала, видно по matched_queries ("flat"/"nested").
+    search_mode как в build_queries: titles — только flat, text — только nested.
+    rescore=False — бонусы складываются с основным скором прямо в запросе
+    (для sort/search_after: rescore с сортировкой несовместим).
+    """
+    must_filters = []
+    if start_year and end_year:
+        must_filters.append({
+            "range": {
+                "book_year": {
+                    "gte": f"{start_year}-01-01",
+                    "lte": f"{end_year}-12-31"
+                }
+            }
+        })
+
+    joined_query = " ".join(query_list)
+    title_variant_fields = {"title", "book_name"} if use_subfields else set()
+    page_variant_fields = {"pages.book_page_text"} if use_subfields else set()
+
+    title_match = {"bool": {"should": build_title_clauses(joined_query, title_variant_fields), "minimum_should_match": 1}}
+    page_match = {"nested": {"path": "pages", "query": build_page_text_query(joined_query, page_variant_fields)}}
+
+    nested_clause = {"nested": {**page_match["nested"], "_name": "nested"}}
+    if inner_hits:
+        nested_clause["nested"]["inner_hits"] = {
+            "name": "matched_pages",
+            "size": 5,
+            "highlight": {
+                "fields": {
+                    "pages.book_page_text": {}
+                },
+                "number_of_fragments": 1,
+                "fragment_size": 150
+            }
+        }
+
+    def words_in(fields: list[str], minimum: int) -> dict:
+        return {"multi_match": {"query": joined_query, "fields": fields, "minimum_should_match": minimum}}
+
+    parts = []
+    if search_mode in ["both", "titles", "adaptive"]:
+        parts.append({"bool": {**title_match["bool"], "_name": "flat"}})
+    if search_mode in ["both", "text", "adaptive"]:
+        parts.append(nested_clause)
+
+    scored = {
+        "function_score": {
+            "query": {
+                "bool": {
+                    "must": must_filters,
+                    "should": parts,
+                    "minimum_should_match": 1
+                }
+            },
+            # Как в merge_hits: берётся первая подходящая функция
+            "functions": [
+                {"filter": {"bool": {"filter": [title_match, page_match]}}, "weight": MATCHED_BY_WEIGHTS["both"]},
+                {"filter": page_match, "weight": MATCHED_BY_WEIGHTS["nested"]},
+                {
+                    "script_score": {
+                        "script": {
+                            "source": "_score > params.threshold ? params.high : params.low",
+                            "params": {
+                                "threshold": FLAT_HIGH_SCORE_THRESHOLD,
+                                "high": MATCHED_BY_WEIGHTS["flat_high"],
+                                "low": MATCHED_BY_WEIGHTS["flat_low"]
+                            }
+                        }
+                    }
+                }
+            ],
+            "score_mode": "first",
+            "boost_mode": "multiply"
+        }
+    }
+
+    # Бонусы postprocess_hits: константы за 2+ / 1 совпавших слова
+    bonuses = [
+        {"constant_score": {"filter": words_in(["title", "book_name"], 2),
+                            "boost": TITLE_MULTI_WORD_BONUS - TITLE_SINGLE_WORD_BONUS}},
+        {"constant_score": {"filter": words_in(["title", "book_name"], 1),
+                            "boost": TITLE_SINGLE_WORD_BONUS}},
+        {
+            "nested": {
+                "path": "pages",
+                "score_mode": "max",
+                "query": {
+                    "bool": {
+                        "should": [
+                            {"constant_score": {"filter": words_in(["pages.book_page_text"], 2),
+                                                "boost": PAGE_MULTI_WORD_BONUS - PAGE_SINGLE_WORD_BONUS}},
+                            {"constant_score": {"filter": words_in(["pages.book_page_text"], 1),
+                                                "boost": PAGE_SINGLE_WORD_BONUS}}
+                        ]
+                    }
+                }
+            }
+        }
+    ]
+
+    body = {
+        "size": size,
+        "_source": SEARCH_SOURCE_FIELDS,
+        "highlight": {
+            "fields": {
+                "title": {},
+                "book_name": {}
+            },
+            "number_of_fragments": 1,
+            "fragment_size": 150
+        }
+    }
+    if rescore:
+        body["query"] = scored
+        body["rescore"] = {
+            "window_size": rescore_window,
+            "query": {
+                "rescore_query": {"bool": {"should": bonuses}},
+                "query_weight": 1.0,
+                "rescore_query_weight": 1.0,
+                "score_mode": "total"
+            }
+        }
+    else:
+        # bool суммирует скор must и совпавших should — как score_mode total у rescore
+        body["query"] = {"bool": {"must": [scored], "should": bonuses}}
+    return body
@@ -0,0 +1,108 @@
+# app/cancellation.py
+"""
+Отмена брошенных поисков.
+Каждый запрос /search получает X-Opaque-Id, который уходит во все вызовы OpenSearch.
+Если клиент отключился, задача запроса отменяется, а поисковые задачи
+в кластере с этим X-Opaque-Id снимаются через tasks API —
+брошенные запросы не занимают потоки кластера и CPU воркера.
+"""
+
+import asyncio
+import uuid
+from contextvars import ContextVar
+from typing import Awaitable, Optional
+
+from app.config import settings
+from app.logger_config import setup_logger
+from app.opensearch_client import async_client
+
+logger = setup_logger("cancellation")
+
+current_opaque_id: ContextVar[Optional[str]] = ContextVar("current_opaque_id", default=None)
+
+
+class ClientDisconnected(Exception):
+    pass
+
+
+class CancellationStats:
+    def __init__(self):
+        self.disconnects = 0
+        self.aborted_computations = 0
+        self.cluster_tasks_cancelled = 0
+        self.cluster_cancel_errors = 0
+
+    def stats(self) -> dict:
+        return {
+            "disconnects": self.disconnects,
+            "aborted_computations": self.aborted_computations,
+            "cluster_tasks_cancelled": self.cluster_tasks_cancelled,
+            "cluster_cancel_errors": self.cluster_cancel_errors,
+        }
+
+
+cancellation_stats = CancellationStats()
+_background: set[asyncio.Task] = set()
+
+
+def new_opaque_id() -> str:
+    opaque_id = f"necrasovka-{uuid.uuid4().hex}"
+    current_opaque_id.set(opaque_id)
+    return opaque_id
+
+
+async def cancel_cluster_tasks(opaque_id: str):
+    """Снимает поисковые задачи кластера, запущенные с данным X-Opaque-Id"""
+    try:
+        resp = await async_client.tasks.list(actions="*search*", detailed=True)
+        task_ids = [
+            task_id
+            for node in resp.get("nodes", {}).values()
+            for task_id, task in node.get("tasks", {}).items()
+            if task.get("headers", {}).get("X-Opaque-Id") == opaque_id
+        ]
+        for task_id in task_ids:
+            await async_client.tasks.cancel(task_id=task_id)
+        cancellation_stats.cluster_tasks_cancelled += len(task_ids)
+        if task_ids:
+            logger.info(f"🛑 Отменены задачи кластера {task_ids} для {opaque_id}")
+    except Exception as e:
+        cancellation_stats.cluster_cancel_errors += 1
+        logger.warning(f"⚠️ Не удалось отменить задачи кластера для {opaque_id}: {e}")
+
+
+def schedule_cluster_cancel(opaque_id: Optional[str]):
+    """Запускает отмену в фоне: вызывающая задача сама уже отменяется"""
+    if not opaque_id or not settings.cancel_cluster_tasks:
+        return
+    task = asyncio.ensure_future(cancel_cluster_tasks(opaque_id))
+    _background.add(task)
+    task.add_done_callback(_background.discard)
+
+
+async def cancel_cluster_on_abort(coro: Awaitable):
+    """Выполняет вычисление; если его отменили, снимает и его задачи в кластере"""
+    try:
+        return await coro
+    except asyncio.CancelledError:
+        cancellation_stats.aborted_computations += 1
+        schedule_cluster_cancel(current_opaque_id.get())
+        raise
+
+
+async def run_until_disconnected(request, coro: Awaitable):
+    """Ждёт вычисление, периодически проверяя соединение; при отключении клиента отменяет его"""
+    poll_interval = settings.disconnect_poll_interval
+    task = asyncio.ensure_future(coro)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=poll_interval)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                cancellation_stats.disconnects += 1
+                task.cancel()
+                raise ClientDisconnected()
+    except asyncio.CancelledError:
+        task.cancel()
+        raise
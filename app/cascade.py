@@ -0,0 +1,50 @@
+# app/cascade.py
+"""
+Каскадный поиск (search_mode=adaptive): сначала дешёвый flat-запрос по заголовкам,
+дорогой nested-запрос по страницам — только если заголовков недостаточно:
+мало хитов, низкий лучший скор или у лучшего хита нет точного совпадения фразы.
+"""
+
+from app.config import settings
+from app.latency import LatencyStats
+
+# _name фразовой клаузы в build_title_clauses
+TITLE_PHRASE_QUERY_NAME = "title_phrase"
+
+
+def escalation_reason(flat_hits: list[dict]) -> str | None:
+    """Почему нужен nested-уровень, или None, если flat-результатов достаточно"""
+    if len(flat_hits) < settings.cascade_min_hits:
+        return "few_hits"
+    top = flat_hits[0]
+    if (top.get("_score") or 0.0) < settings.cascade_min_top_score:
+        return "low_score"
+    if settings.cascade_require_phrase and TITLE_PHRASE_QUERY_NAME not in top.get("matched_queries", []):
+        return "no_phrase"
+    return None
+
+
+class CascadeStats:
+    def __init__(self):
+        self.requests = 0
+        self.escalations = 0
+        self.reasons: dict[str, int] = {}
+        self.tier_latency = {"flat": LatencyStats(), "nested": LatencyStats()}
+
+    def record(self, reason: str | None):
+        self.requests += 1
+        if reason is not None:
+            self.escalations += 1
+            self.reasons[reason] = self.reasons.get(reason, 0) + 1
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "escalations": self.escalations,
+            "escalation_rate": self.escalations / self.requests if self.requests else 0.0,
+            "reasons": dict(self.reasons),
+            "tier_latency": {tier: latency.stats() for tier, latency in self.tier_latency.items()},
+        }
+
+
+cascade_stats = CascadeStats()
@@ -1,3 +1,5 @@
+from typing import Optional
+
 from pydantic_settings import BaseSettings
 
 
@@ -7,8 +9,101 @@ class Settings(BaseSettings):
     opensearch_password: str
     typo_api_url: str
 
+    # Размер пула соединений асинхронного клиента OpenSearch
+    opensearch_pool_maxsize: int = 20
+    # Отправлять flat и nested запросы одним _msearch вместо двух search
+    search_use_msearch: bool = False
+
+    # Кэш результатов /search
+    search_cache_enabled: bool = True
+    search_cache_ttl: float = 300.0
+    search_cache_max_mb: int = 64
+    # Как часто (сек) проверять, не изменился ли индекс
+    search_cache_generation_check_interval: float = 5.0
+
+    # Дополнительные варианты запроса: typo, translit, layout (через запятую)
+    query_variants: str = "typo"
+    # Индекс содержит подполя translit/layout (index_body): варианты translit и layout
+    # не добавляются в запрос, их покрывают подполя
+    search_variant_subfields: bool = False
+
+    # Встроенный словарь опечаток (python -m app.spell); если файл есть, сервис не вызывается
+    spell_dictionary_path: str = "data/spell.dict"
+
+    # Сервис опечаток
+    typo_timeout: float = 0.3
+    typo_cache_size: int = 10000
+    typo_pool_size: int = 10
+    typo_breaker_failures: int = 5
+    typo_breaker_reset: float = 30.0
+
+    # Сколько результатов отдаёт /search без пагинации (top-k после ранжирования)
+    search_result_size: int = 50
+
+    # Курсорная пагинация /search
+    search_page_size: int = 20
+    search_pit_keep_alive: str = "5m"
+
+    # Не запрашивать inner_hits в основном поиске: страницы книги
+    # подгружаются по /search/{doc_id}/pages при раскрытии карточки
+    search_lazy_page_hits: bool = False
+
+    # Ранжирование одним запросом на стороне OpenSearch (function_score + rescore)
+    search_server_side_ranking: bool = False
+    search_server_side_size: int = 30
+
+    # Хранимые search templates вместо inline-тел flat/nested запросов
+    search_use_templates: bool = False
+
+    # POST /search/batch
+    batch_max_requests: int = 500
+    batch_msearch_chunk: int = 20  # поисков в одном _msearch
+    batch_concurrency: int = 4  # одновременных _msearch класса batch (на все батчи воркера)
+    batch_postprocess_workers: int = 2
+
+    # Каскадный поиск (search_mode=adaptive): пороги, ниже которых запускается nested-уровень
+    cascade_min_hits: int = 5
+    cascade_min_top_score: float = 200.0
+    cascade_require_phrase: bool = True
+
+    # Бюджет времени на /search по умолчанию (мс), переопределяется параметром budget_ms
+    search_budget_ms: int = 5000
+
+    # Отмена поиска при отключении клиента: период проверки соединения (с)
+    # и снятие задач в кластере через tasks API по X-Opaque-Id
+    disconnect_poll_interval: float = 0.1
+    cancel_cluster_tasks: bool = True
+
+    # Контроль допуска /search: адаптивный лимит одновременных поисков (AIMD)
+    # и ограниченная очередь; при переполнении — 503 с Retry-After
+    admission_enabled: bool = True
+    admission_initial_limit: int = 20
+    admission_min_limit: int = 2
+    admission_max_limit: int = 100
+    admission_max_queue: int = 50
+    admission_queue_timeout: float = 1.0
+    # Порог задержки (с) для снижения лимита; None — tolerance × скользящее среднее
+    # задержки полных ответов за ~baseline_window запросов
+    admission_target_latency: Optional[float] = None
+    admission_latency_tolerance: float = 2.0
+    admission_baseline_window: int = 500
+
+    # Классы приоритета: interactive (/search) обслуживается первым,
+    # batch (/search/batch) и diagnostic (/test-search) — своими пулами соединений
+    # и лимитами одновременных запросов; ожидание уступки ограничено priority_max_yield (с)
+    opensearch_batch_pool_maxsize: int = 4
+    opensearch_diagnostic_pool_maxsize: int = 2
+    diagnostic_concurrency: int = 1
+    priority_max_yield: float = 5.0
+
+    # Состояние фоновых прогонов /test-search (общее для всех воркеров)
+    test_jobs_dir: str = "data/test_jobs"
+
+    # Ответы меньше этого размера (байт) не сжимаются gzip
+    gzip_minimum_size: int = 1024
+
     class Config:
         env_file = ".env"
 
 
-settings = Settings()
\ No newline at end of file
+settings = Settings()
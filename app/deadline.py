@@ -0,0 +1,102 @@
+# app/deadline.py
+"""
+Бюджет времени на запрос /search.
+Deadline кладётся в contextvar в начале запроса, и каждый этап берёт из него
+остаток: таймаут OpenSearch (timeout на стороне кластера и request_timeout клиента),
+таймаут сервиса опечаток. Если бюджет кончился, этап не падает,
+а помечает ответ как частичный — отдаётся то, что успело выполниться.
+"""
+
+import asyncio
+import time
+from contextvars import ContextVar
+from typing import Awaitable, Optional
+
+from opensearchpy.exceptions import ConnectionTimeout
+
+# Запас на сеть и постпроцесс: кластер должен остановиться раньше клиента
+CLUSTER_TIMEOUT_FRACTION = 0.8
+MIN_STAGE_TIMEOUT = 0.01
+
+
+class Deadline:
+    def __init__(self, budget: float):
+        self.budget = budget
+        self.expires_at = time.monotonic() + budget
+        self.partial_reasons: list[str] = []
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0.0
+
+    @property
+    def partial(self) -> bool:
+        return bool(self.partial_reasons)
+
+    def mark_partial(self, reason: str):
+        if reason not in self.partial_reasons:
+            self.partial_reasons.append(reason)
+
+    def stage_timeout(self, cap: Optional[float] = None) -> float:
+        remaining = max(self.remaining(), MIN_STAGE_TIMEOUT)
+        return min(remaining, cap) if cap is not None else remaining
+
+    def cluster_timeout(self) -> str:
+        """Значение timeout для OpenSearch: шарды возвращают то, что нашли, с timed_out=true"""
+        return f"{max(1, int(self.stage_timeout() * CLUSTER_TIMEOUT_FRACTION * 1000))}ms"
+
+
+current_deadline: ContextVar[Optional[Deadline]] = ContextVar("current_deadline", default=None)
+
+
+def search_kwargs() -> dict:
+    """Параметры search/search_template для текущего запроса: бюджет и X-Opaque-Id"""
+    from app.cancellation import current_opaque_id
+
+    kwargs = {}
+    opaque_id = current_opaque_id.get()
+    if opaque_id:
+        kwargs["opaque_id"] = opaque_id
+    deadline = current_deadline.get()
+    if deadline is not None:
+        kwargs.update(timeout=deadline.cluster_timeout(), request_timeout=deadline.stage_timeout())
+    return kwargs
+
+
+def client_kwargs() -> dict:
+    """search_kwargs без timeout кластера — для _msearch и шаблонов, где он не передаётся в URL"""
+    return {k: v for k, v in search_kwargs().items() if k != "timeout"}
+
+
+def note_timed_out(response: dict, name: str):
+    """Кластер вернул неполный ответ по timeout — помечаем результат как частичный"""
+    deadline = current_deadline.get()
+    if deadline is not None and response.get("timed_out"):
+        deadline.mark_partial(f"{name}_timed_out")
+
+
+async def gather_within_deadline(calls: dict[str, Awaitable]) -> dict:
+    """Ждёт вызовы до конца бюджета. Без бюджета — обычный gather.
+    С бюджетом — незавершённые отменяются и в результат не попадают."""
+    deadline = current_deadline.get()
+    if deadline is None:
+        return dict(zip(calls, await asyncio.gather(*calls.values())))
+
+    tasks = {name: asyncio.ensure_future(call) for name, call in calls.items()}
+    done, pending = await asyncio.wait(tasks.values(), timeout=deadline.remaining())
+    for task in pending:
+        task.cancel()
+
+    results = {}
+    for name, task in tasks.items():
+        if task in pending:
+            deadline.mark_partial(f"{name}_deadline")
+        elif isinstance(task.exception(), (asyncio.TimeoutError, ConnectionTimeout)):
+            # request_timeout клиента сработал на исходе бюджета
+            deadline.mark_partial(f"{name}_deadline")
+        else:
+            results[name] = task.result()
+    return results
@@ -0,0 +1,41 @@
+# app/fast_json.py
+"""
+Быстрая сериализация ответов.
+С orjson (есть в requirements.txt) — он, без orjson — стандартный json
+с компактными разделителями. Оба варианта понимают SearchResult.
+"""
+
+import json
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+from app.result_model import SearchResult
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson необязателен
+    orjson = None
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, SearchResult):
+        return value.to_dict()
+    return str(value)
+
+
+if orjson is not None:
+    def dumps(value: Any) -> bytes:
+        # dataclass со slots orjson сериализует сам, без to_dict
+        return orjson.dumps(value, default=_default, option=orjson.OPT_NON_STR_KEYS)
+else:
+    def dumps(value: Any) -> bytes:
+        return json.dumps(value, ensure_ascii=False, separators=(",", ":"), default=_default).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse на dumps. Возвращается из эндпоинта готовым объектом —
+    так FastAPI не гоняет содержимое через jsonable_encoder"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -1,3 +1,48 @@
+from app.query_understanding import RUS_TO_ENG, ENG_KEYS, RUS_KEYS
+
+# Клавиши раскладки, которые в тексте встречаются как пунктуация:
+# меняем их на русскую букву только между буквами ("gfkt[f" → "палеха")
+LAYOUT_PUNCTUATION = "[]{};:'\"<>,.`~"
+
+
+def _translit_mappings() -> list[str]:
+    """Кириллица → латиница по той же таблице, что и query-time transliterate"""
+    mappings = []
+    for rus, eng in RUS_TO_ENG.items():
+        mappings.append(f"{rus} => {eng}")
+        mappings.append(f"{rus.upper()} => {eng.capitalize()}")
+    return mappings
+
+
+def _layout_mappings() -> list[str]:
+    """Латинские клавиши → русские буквы на тех же клавишах"""
+    return [
+        f"{eng} => {rus}"
+        for eng, rus in zip(ENG_KEYS, RUS_KEYS)
+        if eng.isascii() and eng.isalpha()
+    ]
+
+
+def _layout_punctuation_filters() -> dict:
+    filters = {}
+    for i, (eng, rus) in enumerate(zip(ENG_KEYS, RUS_KEYS)):
+        if eng in LAYOUT_PUNCTUATION and rus.isalpha():
+            filters[f"layout_punct_{i}"] = {
+                "type": "pattern_replace",
+                "pattern": f"(?<=\\p{{L}})\\{eng}(?=\\p{{L}})",
+                "replacement": rus
+            }
+    return filters
+
+
+def _text_with_variants(field: dict) -> dict:
+    """Текстовое поле + подполя translit и layout для поиска без fan-out вариантов запроса"""
+    fields = dict(field.get("fields", {}))
+    fields["translit"] = {"type": "text", "analyzer": "translit_analyzer"}
+    fields["layout"] = {"type": "text", "analyzer": "layout_analyzer"}
+    return {**field, "fields": fields}
+
+
 def get_better_index_body():
     return {
         "settings": {
@@ -13,7 +58,33 @@ def get_better_index_body():
                         "max_gram": 20
                     }
                 },
+                "char_filter": {
+                    "translit_char_filter": {
+                        "type": "mapping",
+                        "mappings": _translit_mappings()
+                    },
+                    "layout_char_filter": {
+                        "type": "mapping",
+                        "mappings": _layout_mappings()
+                    },
+                    **_layout_punctuation_filters()
+                },
                 "analyzer": {
+                    # Одинаковая нормализация при индексации и поиске:
+                    # "палех" и "palekh" дают один и тот же токен
+                    "translit_analyzer": {
+                        "type": "custom",
+                        "char_filter": ["translit_char_filter"],
+                        "tokenizer": "standard",
+                        "filter": ["lowercase"]
+                    },
+                    # "gfkt[" и "палех" дают один и тот же токен
+                    "layout_analyzer": {
+                        "type": "custom",
+                        "char_filter": list(_layout_punctuation_filters()) + ["layout_char_filter"],
+                        "tokenizer": "standard",
+                        "filter": ["lowercase", "russian_stemmer"]
+                    },
                     "index_analyzer": {
                         "type": "custom",
                         "tokenizer": "standard",
@@ -38,19 +109,19 @@ def get_better_index_body():
         },
         "mappings": {
             "properties": {
-                "title": {
+                "title": _text_with_variants({
                     "type": "text",
                     "analyzer": "index_analyzer",
                     "search_analyzer": "search_analyzer",
                     "fields": {
                         "keyword": { "type": "keyword", "ignore_above": 256 }
                     }
-                },
-                "book_name": {
+                }),
+                "book_name": _text_with_variants({
                     "type": "text",
                     "analyzer": "index_analyzer",
                     "search_analyzer": "search_analyzer"
-                },
+                }),
                 "referat": {
                     "type": "text",
                     "analyzer": "index_analyzer",
@@ -75,15 +146,24 @@ def get_better_index_body():
                 "lang": {
                     "type": "keyword"
                 },
+                "cover_page": {
+                    "properties": {
+                        "page": {"type": "long"},
+                        "image": {"type": "keyword", "index": False}
+                    }
+                },
+                "page_count": {
+                    "type": "integer"
+                },
                 "pages": {
                     "type": "nested",
                     "properties": {
                         "book_page": {"type": "long"},
-                        "book_page_text": {
+                        "book_page_text": _text_with_variants({
                             "type": "text",
                             "analyzer": "index_analyzer",
                             "search_analyzer": "search_analyzer"
-                        },
+                        }),
                         "book_page_image": {"type": "keyword"},
                         "cover_book_page": {"type": "long"}
                     }
@@ -0,0 +1,34 @@
+# app/latency.py
+"""Счётчик задержек для /metrics: количество, среднее, максимум и перцентили по окну последних замеров"""
+
+from collections import deque
+
+
+class LatencyStats:
+    def __init__(self, window: int = 1000):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._recent = deque(maxlen=window)
+
+    def observe(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self._recent.append(seconds)
+
+    def percentile(self, p: float) -> float:
+        if not self._recent:
+            return 0.0
+        ordered = sorted(self._recent)
+        return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+    def stats(self) -> dict:
+        return {
+            "count": self.count,
+            "avg": round(self.total / self.count, 4) if self.count else 0.0,
+            "p50": round(self.percentile(50), 4),
+            "p95": round(self.percentile(95), 4),
+            "p99": round(self.percentile(99), 4),
+            "max": round(self.max, 4),
+        }
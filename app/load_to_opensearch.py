@@ -3,7 +3,8 @@ import json
 import os
 from opensearchpy import OpenSearch, helpers
 from dotenv import load_dotenv
-from app.index_body import get_index_body
+from app.index_body import get_better_index_body
+from app.postprocess_hits import pick_cover_page
 import logging
 
 # --- ЛОГГЕР ---
@@ -31,7 +32,7 @@ client = OpenSearch(
 # --- INDEX CREATION ---
 if not client.indices.exists(INDEX_NAME):
     log.info(f"Создание индекса {INDEX_NAME}...")
-    client.indices.create(index=INDEX_NAME, body=get_index_body())
+    client.indices.create(index=INDEX_NAME, body=get_better_index_body())
 else:
     log.info(f"Индекс {INDEX_NAME} уже существует.")
 
@@ -45,6 +46,17 @@ try:
     merged = pd.merge(pages, books, on="book_id", suffixes=("_page", "_meta"))
     log.info(f"Совмещённых записей: {len(merged)}")
 
+    # обложка и число страниц считаются один раз на книгу,
+    # чтобы поиску не приходилось тянуть массив pages
+    book_covers = {}
+    for book_id, book_pages in pages.groupby("book_id"):
+        book_pages = book_pages.sort_values("book_page").astype(object)
+        records = book_pages.where(book_pages.notna(), None).to_dict("records")
+        book_covers[book_id] = {
+            "cover_page": pick_cover_page(records),
+            "page_count": len(records),
+        }
+
     # пробная выборка
     sample = merged.head(100)
 
@@ -59,6 +71,7 @@ try:
                 "book_code": row.get("book_code"),
                 "book_page_image": row.get("book_page_image"),
                 "book_path": row.get("book_path"),
+                **book_covers.get(row["book_id"], {}),
             }
         }
 
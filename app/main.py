@@ -1,23 +1,53 @@
-from fastapi import FastAPI, HTTPException, Query, Body
+from fastapi import FastAPI, HTTPException, Query, Body, Request
 from fastapi.middleware.cors import CORSMiddleware
-from app.opensearch_client import client
-from app.typo_client import fix_typo
-from app.utils import transliterate, local_changer, coalesce, detect_publication_type, extract_clean_query
-from app.postprocess_hits import postprocess_hits, apply_diversity
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import StreamingResponse, Response
+from pydantic import BaseModel, Field
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+from app.opensearch_client import client, async_client, batch_async_client, diagnostic_async_client
+from app.typo_client import fix_typo, typo_client
+from app.utils import coalesce
+from app.publication_types import parse_publication_query
+from app.query_understanding import query_variants
+from app.postprocess_hits import score_candidates, materialize, extract_matched_pages
+from app.ranking import merge_candidates, select_top, MAX_PER_TYPE
 from app.logger_config import setup_logger
 from app.config import settings
 import time
 import uvicorn
 import asyncio
-from app.build_query import build_flat_query, build_nested_query  # добавь nested
+from app.build_query import build_flat_query, build_nested_query, build_book_pages_query, build_combined_query  # добавь nested
 from app.interaction_logger import log_interaction
+from app.search_cache import search_cache, make_search_key, IndexGenerationTracker
+from app.singleflight import search_flight
+from app.spell import get_spell_dictionary
+from app.search_templates import search_templates
+from app.cascade import cascade_stats, escalation_reason
+from app.deadline import Deadline, current_deadline, search_kwargs, client_kwargs, note_timed_out, gather_within_deadline
+from app.cancellation import (
+    ClientDisconnected, current_opaque_id, new_opaque_id, cancellation_stats,
+    cancel_cluster_on_abort, run_until_disconnected, schedule_cluster_cancel
+)
+from app.admission import admitted, search_limiter, Overloaded
+from app.priority import priority_scheduler, current_priority, BATCH
+from app.test_jobs import test_job_runner, TestJobStarting
+from app.fast_json import FastJSONResponse, dumps
+from app.result_model import parse_fields, project
+from app.pagination import SearchCursor, InvalidCursor, encode_cursor, decode_cursor, paginate_body, next_page, request_fingerprint
 
 logger = setup_logger("search_service")
 
+generation_tracker = IndexGenerationTracker(
+    async_client,
+    check_interval=settings.search_cache_generation_check_interval
+)
+
 app = FastAPI(
     title="FastAPI OpenSearch Service",
     description="Сервис поиска по индексу OpenSearch",
-    version="0.1.0"
+    version="0.1.0",
+    default_response_class=FastJSONResponse
 )
 
 app.add_middleware(
@@ -28,6 +58,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Сжатие по Accept-Encoding клиента; мелкие ответы не сжимаются
+app.add_middleware(GZipMiddleware, minimum_size=settings.gzip_minimum_size)
+
 # Запуск автотестов при старте приложения
 # Автотесты отключены для быстрого старта
 # @app.on_event("startup")
@@ -42,94 +75,257 @@ app.add_middleware(
 #         logger.info("Приложение продолжит работу без автотестов")
 
 
+@app.on_event("startup")
+async def load_spell_dictionary():
+    """Открывает словарь опечаток заранее, чтобы первый запрос не платил за mmap"""
+    spell_dictionary = get_spell_dictionary()
+    if spell_dictionary is not None:
+        logger.info(f"📖 Словарь опечаток: {spell_dictionary.path}, слов={spell_dictionary.n_words}")
+    else:
+        logger.info("📖 Словарь опечаток не найден, используется сервис опечаток")
+
+
+@app.on_event("startup")
+async def register_search_templates():
+    """Регистрирует шаблоны flat/nested запросов; при ошибке остаются inline-тела"""
+    if settings.search_use_templates:
+        await search_templates.register(async_client)
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Закрывает пулы соединений асинхронных клиентов"""
+    await test_job_runner.close()
+    await async_client.close()
+    await batch_async_client.close()
+    await diagnostic_async_client.close()
+    await typo_client.close()
+    batch_executor.shutdown(wait=False)
+
+
 @app.get("/", tags=["Health"])
 async def health_check():
     return {"status": "ok"}
 
 
-@app.get("/test-search", tags=["Testing"])
+@app.get("/metrics", tags=["Monitoring"])
+async def metrics():
+    """Счётчики внутренних компонентов сервиса"""
+    return {
+        "search_cache": search_cache.stats(),
+        "search_coalescing": search_flight.stats(),
+        "typo_client": typo_client.stats(),
+        "cascade": cascade_stats.stats(),
+        "cancellation": cancellation_stats.stats(),
+        "admission": search_limiter.stats(),
+        "priority_classes": priority_scheduler.stats()
+    }
+
+
+@app.get("/test-search", tags=["Testing"], status_code=202)
 async def run_search_quality_tests():
-    """Запуск автотестов системы поиска вручную"""
+    """Запуск автотестов системы поиска в фоне; статус — /test-search/{job_id}"""
     try:
-        from app.search_tests import run_search_tests
-        logger.info("🧪 Запуск автотестов по API запросу...")
-        summary = await run_search_tests()
-        return {
-            "status": "completed",
-            "summary": summary
-        }
-    except Exception as e:
-        logger.error(f"❌ Ошибка при выполнении автотестов: {e}")
-        raise HTTPException(status_code=500, detail=f"Ошибка автотестов: {str(e)}")
+        job, created = test_job_runner.submit()
+    except TestJobStarting:
+        raise HTTPException(status_code=409, detail="Прогон автотестов уже запускается, повторите запрос")
+    if created:
+        logger.info(f"🧪 Запуск автотестов по API запросу, задание {job.id}")
+    return {
+        **job.to_dict(),
+        "deduplicated": not created,
+        "status_url": f"/test-search/{job.id}"
+    }
+
+
+@app.get("/test-search/{job_id}", tags=["Testing"])
+async def search_quality_tests_status(job_id: str):
+    """Ход и итог прогона автотестов"""
+    job = test_job_runner.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Задание автотестов {job_id} не найдено")
+    return job.to_dict()
+
+
+def query_names(search_mode="both") -> list[str]:
+    names = []
+    if search_mode in ["both", "titles", "adaptive"]:
+        names.append("flat")
+    if search_mode in ["both", "text", "adaptive"]:
+        names.append("nested")
+    return names
 
 
-def merge_hits(flat_hits, nested_hits):
-    combined = {}
+def build_queries(query_list, start_year, end_year, search_mode="both", size=50) -> dict:
+    """Тела запросов для выбранного режима поиска: {"flat": ..., "nested": ...}"""
+    # adaptive вне каскада (страницы, поток) ведёт себя как both
+    queries = {}
+    if search_mode in ["both", "titles", "adaptive"]:
+        queries["flat"] = build_flat_query(query_list, start_year, end_year, use_subfields=settings.search_variant_subfields, size=size)
+    if search_mode in ["both", "text", "adaptive"]:
+        queries["nested"] = build_nested_query(query_list, start_year, end_year, use_subfields=settings.search_variant_subfields, size=size,
+                                               inner_hits=not settings.search_lazy_page_hits)
+    return queries
 
-    for hit in flat_hits:
-        _id = hit["_id"]
-        combined[_id] = {
-            "hit": hit,
-            "from_flat": True,
-            "from_nested": False
+
+async def gated(call):
+    """Вызов OpenSearch в очереди и пуле соединений класса приоритета текущего запроса"""
+    async with priority_scheduler.gate() as os_client:
+        return await call(os_client)
+
+
+async def run_queries(index, queries: dict, use_msearch=None) -> dict:
+    """Выполняет тела запросов и возвращает ответы по тем же ключам.
+
+    По умолчанию запросы идут параллельно отдельными search; при settings.search_use_msearch
+    (или use_msearch=True) все тела уходят одним _msearch за один round-trip.
+    index=None — запросы поверх PIT, индекс задаётся самим PIT.
+    При бюджете запроса (deadline) ответы, не успевшие к сроку, отсутствуют.
+    """
+    if use_msearch is None:
+        use_msearch = settings.search_use_msearch
+
+    kwargs = search_kwargs()
+    if use_msearch:
+        bodies = [{**body, "timeout": kwargs["timeout"]} if "timeout" in kwargs else body for body in queries.values()]
+        done = await gather_within_deadline({"msearch": msearch(index, bodies, **client_kwargs())})
+        responses = dict(zip(queries, done["msearch"])) if done else {}
+    else:
+        # Время ответа = максимум из запросов, а не их сумма
+        responses = await gather_within_deadline({
+            name: gated(lambda os_client, body=body: os_client.search(index=index, body=body, **kwargs))
+            for name, body in queries.items()
+        })
+
+    for name, resp in responses.items():
+        note_timed_out(resp, name)
+    return responses
+
+
+async def run_template_queries(index, requests: dict, use_msearch=None) -> dict:
+    """Как run_queries, но по хранимым шаблонам: {"id": ..., "params": ...}"""
+    if use_msearch is None:
+        use_msearch = settings.search_use_msearch
+
+    # timeout кластера в шаблоне не передать — остаётся только таймаут клиента
+    kwargs = client_kwargs()
+
+    async def msearch_template(lines):
+        resp = await gated(lambda os_client: os_client.msearch_template(body=lines, **kwargs))
+        for item in resp["responses"]:
+            if "error" in item:
+                raise RuntimeError(f"msearch_template error: {item['error']}")
+        return resp["responses"]
+
+    if use_msearch:
+        lines = []
+        for request in requests.values():
+            lines.append({"index": index})
+            lines.append(request)
+        done = await gather_within_deadline({"msearch": msearch_template(lines)})
+        responses = dict(zip(requests, done["msearch"])) if done else {}
+    else:
+        responses = await gather_within_deadline({
+            name: gated(lambda os_client, request=request: os_client.search_template(index=index, body=request, **kwargs))
+            for name, request in requests.items()
+        })
+
+    for name, resp in responses.items():
+        note_timed_out(resp, name)
+    return responses
+
+
+async def fetch_hits(index, query_list, start_year, end_year, search_mode="both", use_msearch=None):
+    """Выполняет flat и nested запросы, возвращает (flat_hits, nested_hits)"""
+    if settings.search_use_templates and search_templates.ready:
+        requests = {
+            name: search_templates.request(name, query_list, start_year, end_year)
+            for name in query_names(search_mode)
         }
+        responses = await run_template_queries(index, requests, use_msearch)
+    else:
+        queries = build_queries(query_list, start_year, end_year, search_mode)
+        responses = await run_queries(index, queries, use_msearch)
+    hits = {name: resp["hits"]["hits"] for name, resp in responses.items()}
+    return hits.get("flat", []), hits.get("nested", [])
 
-    for hit in nested_hits:
-        _id = hit["_id"]
-        if _id in combined:
-            combined[_id]["from_nested"] = True
-            # добавляем inner_hits
-            combined[_id]["hit"]["inner_hits"] = hit.get("inner_hits")
-        else:
-            combined[_id] = {
-                "hit": hit,
-                "from_flat": False,
-                "from_nested": True
-            }
 
-    merged: list[dict] = []
-    for meta in combined.values():
-        hit = meta["hit"]
-        if meta["from_flat"] and meta["from_nested"]:
-            mb = "both"
-        elif meta["from_nested"]:
-            mb = "nested"
-        else:
-            mb = "flat"
-        # кладём в _source, чтобы постпроцесс и UI его увидели
-        hit["_source"]["matched_by"] = mb
-        merged.append(hit)
-
-    def scoring_key(hit):
-        mb = hit["_source"].get("matched_by", "")
-        score = hit.get("_score", 0)
-        
-        # Проверяем, есть ли все слова запроса в заголовке
-        title = hit["_source"].get("title", "").lower()
-        book_name = hit["_source"].get("book_name", "").lower()
-        
-        # Получаем оригинальный запрос из контекста (если доступен)
-        # Пока используем простую эвристику
-        
-        if mb == "nested":
-            # Nested результаты (с совпадениями в тексте) получают буст
-            score *= 1.4
-        elif mb == "both":
-            # Результаты из обоих источников - максимальный буст
-            score *= 1.6
-        elif mb == "flat":
-            # Flat результаты получают буст только если скор действительно высокий
-            # Это означает хорошее совпадение в заголовке
-            if score > 200:  # Повышаем порог для flat буста
-                score *= 1.2
-            else:
-                # Понижаем приоритет частичных совпадений в заголовках
-                score *= 0.9
+async def fetch_hits_cascade(index, query_list, start_year, end_year):
+    """Каскад: flat-запрос, затем nested только если escalation_reason() его требует"""
+    tier_start = time.time()
+    flat_hits, _ = await fetch_hits(index, query_list, start_year, end_year, "titles")
+    cascade_stats.tier_latency["flat"].observe(time.time() - tier_start)
+
+    reason = escalation_reason(flat_hits)
+    cascade_stats.record(reason)
+    if reason is None:
+        logger.info(f"🪜 Cascade: flat достаточно ({len(flat_hits)} хитов)")
+        return flat_hits, []
 
-        return score
+    tier_start = time.time()
+    _, nested_hits = await fetch_hits(index, query_list, start_year, end_year, "text")
+    cascade_stats.tier_latency["nested"].observe(time.time() - tier_start)
+    logger.info(f"🪜 Cascade: эскалация в nested ({reason})")
+    return flat_hits, nested_hits
 
-    return sorted(merged, key=scoring_key, reverse=True)
 
+async def fetch_hits_page(index, query_list, start_year, end_year, search_mode, page_size, cursor: SearchCursor | None, fingerprint):
+    """Одна страница выдачи через search_after поверх PIT.
+
+    Листается один запрос build_combined_query с ранжированием в OpenSearch,
+    поэтому у всех страниц один порядок: книги не теряются и не повторяются,
+    а в курсоре только позиция последнего хита (без diversity — отсечённые
+    ограничением книги пропали бы из выдачи насовсем).
+    Возвращает (results, next_cursor, total).
+    """
+    keep_alive = settings.search_pit_keep_alive
+    if cursor is None:
+        pit = await gated(lambda os_client: os_client.create_point_in_time(index=index, keep_alive=keep_alive))
+        cursor = SearchCursor(pit_id=pit["pit_id"], request_fingerprint=fingerprint)
+
+    body = build_combined_query(
+        query_list, start_year, end_year,
+        use_subfields=settings.search_variant_subfields,
+        size=page_size,
+        inner_hits=not settings.search_lazy_page_hits,
+        search_mode=search_mode,
+        rescore=False
+    )
+    responses = await run_queries(None, {"page": paginate_body(body, cursor.pit_id, keep_alive, cursor.search_after)})
+    response = responses.get("page")
+
+    hits, next_page_cursor = next_page(cursor, response, page_size)
+    mark_matched_by(hits)
+    results = [materialize(candidate) for candidate in score_candidates(hits, apply_boosts=False)]
+    total = response["hits"]["total"]["value"] if response else 0
+
+    if next_page_cursor is None:
+        await gated(lambda os_client: os_client.delete_point_in_time(body={"pit_id": [cursor.pit_id]}))
+        return results, None, total
+    return results, encode_cursor(next_page_cursor), total
+
+
+async def msearch(index, bodies, **client_kwargs):
+    """Отправляет несколько тел запросов одним _msearch и возвращает ответы в том же порядке"""
+    responses = await msearch_pairs([(index, body) for body in bodies], **client_kwargs)
+    for item in responses:
+        if "error" in item:
+            raise RuntimeError(f"msearch error: {item['error']}")
+    return responses
+
+
+async def msearch_pairs(pairs, **client_kwargs):
+    """_msearch по парам (индекс, тело); ошибки отдельных запросов остаются в ответах"""
+    if not pairs:
+        return []
+
+    lines = []
+    for index, body in pairs:
+        lines.append({"index": index} if index else {})
+        lines.append(body)
+
+    resp = await gated(lambda os_client: os_client.msearch(body=lines, **client_kwargs))
+    return resp["responses"]
 
 
 likes = []
@@ -143,72 +339,493 @@ async def like_card(
     log_interaction(query=query, result_ids=[], doc_id=doc_id)
     return {"status": "ok"}
 
+async def build_query_list(clean_query: str) -> list[str]:
+    """Собирает варианты запроса; сервис опечаток вызывается, только если вариант typo включён"""
+    variants = {v.strip() for v in settings.query_variants.split(",")}
+    if settings.search_variant_subfields:
+        variants -= {"translit", "layout"}
+    compiled = query_variants(clean_query)
+    spelling = await fix_typo(clean_query) if "typo" in variants else clean_query
+    layout = compiled.layout_changed if "layout" in variants else clean_query
+    translit = compiled.transliterated if "translit" in variants else clean_query
+    return coalesce(clean_query, spelling, layout, translit)
+
+
+async def prepare_query_list(index, q, search_mode) -> list[str]:
+    """Разбор типа издания и варианты очищенного запроса"""
+    # Определяем тип издания из запроса
+    parsed = parse_publication_query(q)
+    publication_types, clean_query = parsed.publication_types, parsed.clean_query
+
+    # Используем очищенный запрос для генерации вариантов
+    query_list = await build_query_list(clean_query)
+
+    logger.info(f"🔍 Search request: index={index}, original='{q}', clean='{clean_query}', types={publication_types}, variants={query_list}, mode={search_mode}")
+    return query_list
+
+
+def rank_hits(flat_hits, nested_hits, diversity=True, k=None) -> list[dict]:
+    """merge → скоринг → отбор top-k с diversity → сборка записей только для отобранных"""
+    candidates = score_candidates(merge_candidates(flat_hits, nested_hits))
+    # diversity: не больше MAX_PER_TYPE результатов на path_index, прямо при отборе
+    top = select_top(candidates, max_per_type=MAX_PER_TYPE if diversity else None, k=k)
+    results = [materialize(candidate) for candidate in top]
+
+    for h in results:
+        logger.info(f"📄 hit {h.path_index} {h.book_id} {h.id} {h.book_code}")
+
+    return results
+
+
+def mark_matched_by(hits):
+    """matched_by по matched_queries build_combined_query ("flat"/"nested")"""
+    for hit in hits:
+        matched = set(hit.get("matched_queries", []))
+        if {"flat", "nested"} <= matched:
+            hit["_source"]["matched_by"] = "both"
+        elif "nested" in matched:
+            hit["_source"]["matched_by"] = "nested"
+        else:
+            hit["_source"]["matched_by"] = "flat"
+
+
+async def fetch_server_ranked(index, query_list, start_year, end_year, diversity=True) -> list[dict]:
+    """Один запрос с ранжированием в OpenSearch: приходит сразу итоговый top-N"""
+    body = build_combined_query(
+        query_list, start_year, end_year,
+        use_subfields=settings.search_variant_subfields,
+        size=settings.search_server_side_size,
+        inner_hits=not settings.search_lazy_page_hits
+    )
+    kwargs = search_kwargs()
+    done = await gather_within_deadline({
+        "combined": gated(lambda os_client: os_client.search(index=index, body=body, **kwargs))
+    })
+    if not done:
+        return []
+    note_timed_out(done["combined"], "combined")
+    hits = done["combined"]["hits"]["hits"]
+    mark_matched_by(hits)
+
+    top = select_top(score_candidates(hits, apply_boosts=False), max_per_type=MAX_PER_TYPE if diversity else None,
+                     k=settings.search_server_side_size)
+    return [materialize(candidate) for candidate in top]
+
+
+async def execute_search(index, q, start_year=None, end_year=None, search_mode="both", diversity=True,
+                         page_size=None, cursor=None, fingerprint=None):
+    """Полный цикл поиска: варианты запроса → OpenSearch → merge → постпроцесс → diversity.
+
+    С page_size возвращается одна страница и next_cursor для следующей (без diversity, см. fetch_hits_page).
+    """
+    query_list = await prepare_query_list(index, q, search_mode)
+
+    # Выполняем запросы в зависимости от режима поиска
+    next_cursor = None
+    if page_size:
+        results, next_cursor, total_hits = await fetch_hits_page(
+            index, query_list, start_year, end_year, search_mode, page_size, cursor, fingerprint
+        )
+    elif settings.search_server_side_ranking and search_mode == "both":
+        results = await fetch_server_ranked(index, query_list, start_year, end_year, diversity)
+    elif search_mode == "adaptive":
+        flat_hits, nested_hits = await fetch_hits_cascade(index, query_list, start_year, end_year)
+        results = rank_hits(flat_hits, nested_hits, diversity, k=settings.search_result_size)
+    else:
+        flat_hits, nested_hits = await fetch_hits(index, query_list, start_year, end_year, search_mode)
+        results = rank_hits(flat_hits, nested_hits, diversity, k=settings.search_result_size)
+
+    deadline = current_deadline.get()
+    partial = {
+        "partial": deadline.partial if deadline else False,
+        "partial_reasons": list(deadline.partial_reasons) if deadline else []
+    }
+
+    if page_size:
+        return {
+            "original_query": q,
+            "corrected_variants": query_list,
+            "total": {"value": total_hits, "relation": "gte"},
+            "results": results,
+            "next_cursor": next_cursor,
+            **partial
+        }
+
+    return {
+        "original_query": q,
+        "corrected_variants": query_list,
+        "total": {"value": len(results), "relation": "eq"},
+        "results": results,
+        **partial
+    }
+
+
+async def execute_admitted(*args, **kwargs):
+    """execute_search под контролем допуска: сверх адаптивного лимита ждёт в очереди или получает Overloaded"""
+    async with admitted():
+        return await execute_search(*args, **kwargs)
+
+
+def overloaded_error(e: Overloaded) -> HTTPException:
+    logger.warning(f"🚦 Search rejected: {e.reason}, retry_after={e.retry_after}s")
+    return HTTPException(status_code=503, detail=f"Service overloaded: {e.reason}",
+                         headers={"Retry-After": str(e.retry_after)})
+
+
+# Нестандартный код nginx: клиент закрыл соединение, ответ никто не прочитает
+CLIENT_CLOSED_REQUEST = 499
+
+
 @app.get("/search", tags=["Search"])
 async def search(
+    request: Request,
     index: str = Query(...),
     q: str = Query(...),
     start_year: int = Query(None, ge=1000, le=2100),
     end_year: int = Query(None, ge=1000, le=2100),
     diversity: bool = Query(False),  # опциональный флаг
-    search_mode: str = Query("both", regex="^(both|titles|text)$")  # новый параметр
+    search_mode: str = Query("both", regex="^(both|titles|text|adaptive)$"),  # новый параметр
+    page_size: int = Query(None, ge=1, le=100),
+    cursor: str = Query(None),
+    stream: bool = Query(False),  # NDJSON: сначала flat-результаты, затем итог с nested
+    budget_ms: int = Query(None, ge=50, le=60000),  # бюджет времени, по умолчанию settings.search_budget_ms
+    fields: str = Query(None)  # поля результатов через запятую, например title,score,cover_page
 ):
     logger.info(f"New search query: {q}")
     start = time.time()
+    try:
+        only = parse_fields(fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     diversity=True
+    # Бюджет видят все этапы запроса (contextvar копируется в задачи asyncio)
+    current_deadline.set(Deadline((budget_ms or settings.search_budget_ms) / 1000))
+    # X-Opaque-Id уходит во все вызовы OpenSearch — по нему снимаются задачи брошенного запроса
+    new_opaque_id()
+
+    cache_key = make_search_key(index, q, start_year, end_year, search_mode)
+
+    if page_size or cursor:
+        return await search_page(request, index, q, start_year, end_year, search_mode, diversity,
+                                 page_size or settings.search_page_size, cursor, cache_key, only)
+    if stream:
+        return StreamingResponse(
+            stream_search(index, q, start_year, end_year, search_mode, diversity, cache_key, only),
+            media_type="application/x-ndjson",
+            # GZipMiddleware не трогает ответы с Content-Encoding: сжатие копило бы события в буфере
+            headers={"Content-Encoding": "identity"}
+        )
+    generation = None
+    if settings.search_cache_enabled:
+        generation = await generation_tracker.get(index)
+        search_cache.check_generation(index, generation)
+        cached = search_cache.get(cache_key)
+        if cached is not None:
+            logger.info(f"⚡ Cache hit: q='{q}', time={round(time.time() - start, 3)}s")
+            log_interaction(query=q, result_ids=[hit.id for hit in cached["results"]])
+            return FastJSONResponse(project({**cached, "original_query": q}, only))
+
     try:
-        # Определяем тип издания из запроса
-        publication_types = detect_publication_type(q)
-        clean_query = extract_clean_query(q)
-        
-        # Используем очищенный запрос для генерации вариантов
-        query_list = coalesce(clean_query, transliterate(clean_query), local_changer(clean_query), fix_typo(clean_query))
-        
-        logger.info(f"🔍 Search request: index={index}, original='{q}', clean='{clean_query}', types={publication_types}, variants={query_list}, mode={search_mode}")
-
-        # Выполняем запросы в зависимости от режима поиска
-        flat_resp = None
-        nested_resp = None
-        
-        if search_mode in ["both", "titles"]:
-            flat_query = build_flat_query(query_list, start_year, end_year)
-            flat_resp = client.search(index=index, body=flat_query)
-        
-        if search_mode in ["both", "text"]:
-            nested_query = build_nested_query(query_list, start_year, end_year)
-            nested_resp = client.search(index=index, body=nested_query)
-
-        # Объединяем результаты
-        flat_hits = flat_resp["hits"]["hits"] if flat_resp else []
-        nested_hits = nested_resp["hits"]["hits"] if nested_resp else []
-        combined_hits = merge_hits(flat_hits, nested_hits)
-
-        # Постпроцесс с matched_pages
-        results = postprocess_hits({"hits": {"hits": combined_hits}}, require_inner_hits=False)
-        print([hit["path_index"] for hit in results])
-
-
-        # Применим diversity, если включен
-        if diversity:
-            results = apply_diversity(results, max_per_type=6)
-
-        for h in results:
-            logger.info(f"📄 hit {h['path_index']} {h['book_id']} {h['id']} {h['book_code']}")
-
-        total = {"value": len(results), "relation": "eq"}
+        # Одинаковые одновременные запросы разделяют одно вычисление;
+        # оно отменяется, когда отключились все ожидающие его клиенты.
+        # Бюджет — в ключе: вычисление идёт с deadline первого запроса, и запрос со стандартным
+        # бюджетом не должен получить частичный ответ чужого короткого budget_ms
+        response = await run_until_disconnected(request, search_flight.do(
+            (cache_key, current_deadline.get().budget),
+            lambda: cancel_cluster_on_abort(execute_admitted(index, q, start_year, end_year, search_mode, diversity))
+        ))
+        # Частичный ответ не кэшируем: следующий запрос может успеть целиком
+        if settings.search_cache_enabled and not response.get("partial"):
+            search_cache.check_generation(index, await generation_tracker.get(index))
+            search_cache.put(cache_key, response, generation)
+
+        priority_scheduler.record_request(time.time() - start)
         elapsed = round(time.time() - start, 3)
-        logger.info(f"✅ Search complete: total={total}, time={elapsed}s")
-        log_interaction(query=q, result_ids=[hit["id"] for hit in results])
+        logger.info(f"✅ Search complete: total={response['total']}, partial={response.get('partial_reasons')}, time={elapsed}s")
+        log_interaction(query=q, result_ids=[hit.id for hit in response["results"]])
 
-        return {
-            "original_query": q,
-            "corrected_variants": query_list,
-            "total": total,
-            "results": results
-        }
+        # Готовый ответ: FastAPI не прогоняет результаты через jsonable_encoder
+        return FastJSONResponse(project({**response, "original_query": q}, only))
 
+    except ClientDisconnected:
+        logger.info(f"🔌 Client disconnected: q='{q}', time={round(time.time() - start, 3)}s")
+        return Response(status_code=CLIENT_CLOSED_REQUEST)
+    except Overloaded as e:
+        raise overloaded_error(e)
     except Exception as e:
         logger.exception(f"❌ Search failed for q='{q}': {e}")
         raise HTTPException(status_code=500, detail=f"OpenSearch error: {type(e).__name__} - {e}")
 
+
+class SearchRequest(BaseModel):
+    index: str
+    q: str
+    start_year: Optional[int] = Field(None, ge=1000, le=2100)
+    end_year: Optional[int] = Field(None, ge=1000, le=2100)
+    search_mode: str = Field("both", pattern="^(both|titles|text|adaptive)$")
+
+
+class BatchSearchRequest(BaseModel):
+    requests: list[SearchRequest] = Field(..., min_length=1, max_length=settings.batch_max_requests)
+
+
+batch_executor = ThreadPoolExecutor(max_workers=settings.batch_postprocess_workers, thread_name_prefix="batch-postprocess")
+
+
+@app.post("/search/batch", tags=["Search"])
+async def search_batch(batch: BatchSearchRequest):
+    """Пачка поисков для внутренних инструментов (QA каталога, проверка ссылок, ночные тесты).
+
+    Варианты запроса считаются один раз на уникальный q, запросы уходят
+    чанками _msearch с ограниченной параллельностью, постпроцесс — в пуле потоков.
+    Результаты возвращаются в порядке запросов.
+    """
+    start = time.time()
+    # Пакетные запросы: свой пул соединений, batch_concurrency одновременных _msearch,
+    # уступают интерактивному поиску
+    current_priority.set(BATCH)
+    requests = batch.requests
+    responses: list = [None] * len(requests)
+
+    # Кэш результатов общий с /search
+    pending = []
+    # Поколения индексов до _msearch: результат, посчитанный по старым данным, не кэшируется
+    generations = {}
+    if settings.search_cache_enabled:
+        for index in {r.index for r in requests}:
+            generations[index] = await generation_tracker.get(index)
+            search_cache.check_generation(index, generations[index])
+    for i, r in enumerate(requests):
+        cache_key = make_search_key(r.index, r.q, r.start_year, r.end_year, r.search_mode)
+        cached = search_cache.get(cache_key) if settings.search_cache_enabled else None
+        if cached is not None:
+            responses[i] = {**cached, "original_query": r.q}
+        else:
+            pending.append((i, r, cache_key))
+
+    # Варианты запроса — один раз на уникальный текст
+    distinct = {r.q: r for _, r, _ in pending}
+    prepared = await asyncio.gather(*(prepare_query_list(r.index, q, r.search_mode) for q, r in distinct.items()))
+    query_lists = dict(zip(distinct, prepared))
+
+    loop = asyncio.get_running_loop()
+
+    async def run_chunk(chunk):
+        pairs, owners = [], []
+        for i, r, cache_key in chunk:
+            for name, body in build_queries(query_lists[r.q], r.start_year, r.end_year, r.search_mode).items():
+                pairs.append((r.index, body))
+                owners.append((i, name))
+
+        try:
+            raw = await msearch_pairs(pairs)
+        except Exception as e:
+            logger.exception(f"❌ Batch chunk failed: {e}")
+            for i, r, _ in chunk:
+                responses[i] = {"original_query": r.q, "error": f"OpenSearch error: {type(e).__name__} - {e}"}
+            return
+
+        hits = {i: {} for i, _, _ in chunk}
+        errors = {}
+        for (i, name), item in zip(owners, raw):
+            if "error" in item:
+                errors[i] = item["error"]
+            else:
+                hits[i][name] = item["hits"]["hits"]
+
+        for i, r, cache_key in chunk:
+            if i in errors:
+                responses[i] = {"original_query": r.q, "error": f"OpenSearch error: {errors[i]}"}
+                continue
+            results = await loop.run_in_executor(
+                batch_executor, rank_hits, hits[i].get("flat", []), hits[i].get("nested", []), True, settings.search_result_size
+            )
+            response = {
+                "original_query": r.q,
+                "corrected_variants": query_lists[r.q],
+                "total": {"value": len(results), "relation": "eq"},
+                "results": results
+            }
+            if settings.search_cache_enabled:
+                search_cache.check_generation(r.index, await generation_tracker.get(r.index))
+                search_cache.put(cache_key, response, generations[r.index])
+            responses[i] = response
+
+    chunk_size = settings.batch_msearch_chunk
+    await asyncio.gather(*(run_chunk(pending[k:k + chunk_size]) for k in range(0, len(pending), chunk_size)))
+
+    priority_scheduler.record_request(time.time() - start)
+    elapsed = round(time.time() - start, 3)
+    logger.info(f"✅ Batch search complete: requests={len(requests)}, cached={len(requests) - len(pending)}, time={elapsed}s")
+    return FastJSONResponse({"responses": responses})
+
+
+# OpenSearch по умолчанию не отдаёт inner_hits дальше from + size = 100
+MAX_INNER_HITS_WINDOW = 100
+
+
+@app.get("/search/{doc_id}/pages", tags=["Search"])
+async def search_book_pages(
+    doc_id: str,
+    index: str = Query(...),
+    q: str = Query(...),
+    page: int = Query(1, ge=1),
+    page_size: int = Query(5, ge=1, le=20)
+):
+    """Совпавшие страницы одной книги (id из результатов /search) с подсветкой — по запросу,
+    а не в каждом поиске"""
+    if page * page_size > MAX_INNER_HITS_WINDOW:
+        raise HTTPException(status_code=400, detail=f"page * page_size не может превышать {MAX_INNER_HITS_WINDOW}")
+
+    start = time.time()
+    try:
+        query_list = await prepare_query_list(index, q, "text")
+        body = build_book_pages_query(query_list, doc_id, page, page_size, use_subfields=settings.search_variant_subfields)
+        # routing по _id: запрос идёт в один шард, где лежит книга
+        resp = await gated(lambda os_client: os_client.search(index=index, body=body, routing=doc_id))
+    except Exception as e:
+        logger.exception(f"❌ Book pages search failed for doc_id={doc_id}, q='{q}': {e}")
+        raise HTTPException(status_code=500, detail=f"OpenSearch error: {type(e).__name__} - {e}")
+
+    hits = resp["hits"]["hits"]
+    if not hits:
+        return {"id": doc_id, "total": 0, "page": page, "page_size": page_size, "matched_pages": []}
+
+    hit = hits[0]
+    total = hit["inner_hits"]["matched_pages"]["hits"]["total"]["value"]
+    matched_pages = extract_matched_pages(hit)
+    logger.info(f"📑 Book pages: doc_id={doc_id}, total={total}, page={page}, time={round(time.time() - start, 3)}s")
+
+    return {
+        "id": doc_id,
+        "total": total,
+        "page": page,
+        "page_size": page_size,
+        "matched_pages": matched_pages
+    }
+
+
+async def stream_search(index, q, start_year, end_year, search_mode, diversity, cache_key, only=None):
+    """NDJSON-поток: {"type": "partial"} с результатами по заголовкам, как только готов
+    дешёвый flat-запрос, затем {"type": "final"} после nested с полным переранжированием"""
+    start = time.time()
+
+    def event(event_type, payload):
+        return dumps({"type": event_type, **project(payload, only)}) + b"\n"
+
+    generation = None
+    if settings.search_cache_enabled:
+        generation = await generation_tracker.get(index)
+        search_cache.check_generation(index, generation)
+        cached = search_cache.get(cache_key)
+        if cached is not None:
+            log_interaction(query=q, result_ids=[hit.id for hit in cached["results"]])
+            yield event("final", {**cached, "original_query": q})
+            return
+
+    tasks = {}
+    opaque_id = current_opaque_id.get()
+    try:
+        # Поток тоже занимает слот: заголовки уже отправлены, поэтому отказ — событием error
+        async with admitted():
+            query_list = await prepare_query_list(index, q, search_mode)
+            queries = build_queries(query_list, start_year, end_year, search_mode)
+            kwargs = search_kwargs()
+            tasks = {
+                name: asyncio.create_task(gated(lambda os_client, body=body: os_client.search(index=index, body=body, **kwargs)))
+                for name, body in queries.items()
+            }
+
+            async def tier_hits(name):
+                """Хиты одного запроса в пределах бюджета; не успел — пусто, ответ частичный"""
+                if name not in tasks:
+                    return []
+                done = await gather_within_deadline({name: tasks[name]})
+                if name not in done:
+                    return []
+                note_timed_out(done[name], name)
+                return done[name]["hits"]["hits"]
+
+            flat_hits = []
+            if "flat" in tasks:
+                flat_hits = await tier_hits("flat")
+                nested_task = tasks.get("nested")
+                # Если nested уже готов, промежуточный ответ не нужен
+                if nested_task is not None and not nested_task.done():
+                    results = rank_hits(flat_hits, [], diversity, k=settings.search_result_size)
+                    logger.info(f"⚡ Stream partial: results={len(results)}, time={round(time.time() - start, 3)}s")
+                    yield event("partial", {
+                        "original_query": q,
+                        "corrected_variants": query_list,
+                        "total": {"value": len(results), "relation": "eq"},
+                        "results": results
+                    })
+
+            # merge_candidates заново проставляет matched_by, так что flat_hits можно переиспользовать
+            nested_hits = await tier_hits("nested")
+            results = rank_hits(flat_hits, nested_hits, diversity, k=settings.search_result_size)
+            deadline = current_deadline.get()
+            response = {
+                "original_query": q,
+                "corrected_variants": query_list,
+                "total": {"value": len(results), "relation": "eq"},
+                "results": results,
+                "partial": deadline.partial if deadline else False,
+                "partial_reasons": list(deadline.partial_reasons) if deadline else []
+            }
+            # Частичный ответ не кэшируем: следующий запрос может успеть целиком
+            if settings.search_cache_enabled and not response["partial"]:
+                search_cache.check_generation(index, await generation_tracker.get(index))
+                search_cache.put(cache_key, response, generation)
+
+            logger.info(f"✅ Stream complete: total={response['total']}, partial={response['partial_reasons']}, "
+                        f"time={round(time.time() - start, 3)}s")
+            log_interaction(query=q, result_ids=[hit.id for hit in results])
+        # итог отдаём уже после освобождения слота: медленный клиент не должен занижать лимит
+        yield event("final", response)
+
+    except Overloaded as e:
+        yield event("error", {"detail": f"Service overloaded: {e.reason}", "retry_after": e.retry_after})
+    except Exception as e:
+        logger.exception(f"❌ Stream search failed for q='{q}': {e}")
+        yield event("error", {"detail": f"OpenSearch error: {type(e).__name__} - {e}"})
+    finally:
+        # Поток закрыт раньше итога (клиент отключился) — снимаем и задачи в кластере
+        unfinished = [task for task in tasks.values() if not task.done()]
+        for task in unfinished:
+            task.cancel()
+        if unfinished:
+            schedule_cluster_cancel(opaque_id)
+
+
+async def search_page(request, index, q, start_year, end_year, search_mode, diversity, page_size, cursor, cache_key, only=None):
+    """Страница /search по курсору: без кэша и single-flight, у каждого курсора своё состояние"""
+    start = time.time()
+    fingerprint = request_fingerprint(cache_key)
+    try:
+        decoded = decode_cursor(cursor, fingerprint) if cursor else None
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        response = await run_until_disconnected(request, cancel_cluster_on_abort(
+            execute_admitted(index, q, start_year, end_year, search_mode, diversity,
+                             page_size=page_size, cursor=decoded, fingerprint=fingerprint)
+        ))
+    except ClientDisconnected:
+        logger.info(f"🔌 Client disconnected: q='{q}', page cursor={bool(cursor)}")
+        return Response(status_code=CLIENT_CLOSED_REQUEST)
+    except Overloaded as e:
+        raise overloaded_error(e)
+    except Exception as e:
+        logger.exception(f"❌ Search page failed for q='{q}': {e}")
+        raise HTTPException(status_code=500, detail=f"OpenSearch error: {type(e).__name__} - {e}")
+
+    elapsed = round(time.time() - start, 3)
+    logger.info(f"✅ Search page complete: results={len(response['results'])}, time={elapsed}s")
+    log_interaction(query=q, result_ids=[hit.id for hit in response["results"]])
+    return FastJSONResponse(project(response, only))
+
+
 if __name__ == "__main__":
     uvicorn.run("app.main:app", host="0.0.0.0", port=8076, reload=True)
\ No newline at end of file
@@ -1,5 +1,5 @@
 # app/opensearch_client.py
-from opensearchpy import OpenSearch, RequestsHttpConnection
+from opensearchpy import OpenSearch, RequestsHttpConnection, AsyncOpenSearch, AIOHttpConnection
 from app.config import settings
 
 # OpenSearch
@@ -17,3 +17,24 @@ client = OpenSearch(
     verify_certs=False,
     connection_class=RequestsHttpConnection
 )
+
+def make_async_client(pool_maxsize: int) -> AsyncOpenSearch:
+    return AsyncOpenSearch(
+        hosts=[{"host": OPENSEARCH_URL, "port": 9200, 'scheme': 'https'}],
+        http_auth=(OPENSEARCH_USERNAME, OPENSEARCH_PASSWORD),
+        use_ssl=True,
+        verify_certs=False,
+        ssl_show_warn=False,
+        connection_class=AIOHttpConnection,
+        pool_maxsize=pool_maxsize
+    )
+
+
+# Асинхронный клиент для /search: не блокирует event loop,
+# соединения к кластеру переиспользуются из пула aiohttp
+async_client = make_async_client(settings.opensearch_pool_maxsize)
+
+# Отдельные пулы для пакетных и диагностических запросов:
+# они не могут занять соединения интерактивного поиска
+batch_async_client = make_async_client(settings.opensearch_batch_pool_maxsize)
+diagnostic_async_client = make_async_client(settings.opensearch_diagnostic_pool_maxsize)
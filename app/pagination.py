@@ -0,0 +1,83 @@
+# app/pagination.py
+"""
+Курсорная пагинация /search: search_after поверх point-in-time.
+Страницы листают один запрос с одним порядком (build_combined_query, ранжирование
+в OpenSearch), поэтому курсор — это только id PIT, позиция последнего показанного
+хита и отпечаток параметров поиска, чтобы курсор нельзя было применить к другому запросу.
+Размер курсора не зависит от глубины страницы.
+"""
+
+import base64
+import hashlib
+import json
+from dataclasses import dataclass
+from typing import Optional
+
+# Стабильный порядок для search_after: скор, затем порядковый номер документа в шарде
+PAGINATION_SORT = [{"_score": {"order": "desc"}}, {"_doc": {"order": "asc"}}]
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+@dataclass
+class SearchCursor:
+    pit_id: str
+    request_fingerprint: str
+    # sort последнего показанного хита; None — первая страница
+    search_after: Optional[list] = None
+
+
+def request_fingerprint(cache_key: tuple) -> str:
+    return hashlib.sha1(repr(cache_key).encode("utf-8")).hexdigest()[:16]
+
+
+def encode_cursor(cursor: SearchCursor) -> str:
+    payload = {"pit": cursor.pit_id, "fp": cursor.request_fingerprint, "after": cursor.search_after}
+    raw = json.dumps(payload, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: str, expected_fingerprint: str) -> SearchCursor:
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        payload = json.loads(raw)
+        cursor = SearchCursor(pit_id=payload["pit"], request_fingerprint=payload["fp"], search_after=payload["after"])
+        if cursor.search_after is not None and not isinstance(cursor.search_after, list):
+            raise TypeError("after должен быть списком")
+    except (ValueError, KeyError, TypeError) as e:
+        raise InvalidCursor(f"Некорректный курсор: {e}") from e
+
+    if cursor.request_fingerprint != expected_fingerprint:
+        raise InvalidCursor("Курсор относится к другому поисковому запросу")
+    return cursor
+
+
+def paginate_body(body: dict, pit_id: str, keep_alive: str, search_after: Optional[list] = None) -> dict:
+    """Превращает тело запроса в страницу поверх PIT (индекс задаётся самим PIT)"""
+    paged = {**body, "pit": {"id": pit_id, "keep_alive": keep_alive}, "sort": PAGINATION_SORT}
+    if search_after:
+        paged["search_after"] = search_after
+    return paged
+
+
+def next_page(cursor: SearchCursor, response: Optional[dict], page_size: int) -> tuple[list[dict], Optional[SearchCursor]]:
+    """Хиты страницы и курсор следующей (None — выдача исчерпана).
+
+    Ответа нет (не успел к сроку) или кластер вернул неполный ответ (timed_out) —
+    страница пустая, а курсор остаётся на месте: сдвиг за неполный ответ
+    пропустил бы документы с не ответивших вовремя шардов.
+    """
+    if response is None or response.get("timed_out"):
+        return [], cursor
+
+    hits = response["hits"]["hits"]
+    if len(hits) < page_size:
+        return hits, None
+    return hits, SearchCursor(
+        # PIT может вернуть обновлённый id — следующая страница идёт уже по нему
+        pit_id=response.get("pit_id", cursor.pit_id),
+        request_fingerprint=cursor.request_fingerprint,
+        search_after=hits[-1]["sort"]
+    )
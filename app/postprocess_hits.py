@@ -1,10 +1,17 @@
-import json
-from collections import defaultdict
+import re
+
+from app.build_query import TITLE_MULTI_WORD_BONUS, TITLE_SINGLE_WORD_BONUS
+from app.result_model import SearchResult
+
+EM_RE = re.compile(r"<em>(.*?)</em>")
+# Бонус за 2+ совпавших страницы
+DENSE_PAGES_BONUS = 40.0
+
 
 def extract_matched_pages(hit: dict) -> list[dict]:
     matched_pages = []
 
-    inner_hits_dict = hit.get("inner_hits", {})
+    inner_hits_dict = hit.get("inner_hits") or {}
 
     for inner_key, inner in inner_hits_dict.items():
         pages_hits = inner.get("hits", {}).get("hits", [])
@@ -25,112 +32,106 @@ def extract_matched_pages(hit: dict) -> list[dict]:
     return matched_pages
 
 
-def apply_diversity(results: list[dict], max_per_type: int = 3) -> list[dict]:
-    grouped = defaultdict(list)
-    for hit in results:
-        key = hit.get("path_index", "unknown")
-        grouped[key].append(hit)
-
-    diverse_results = []
-    for hits in grouped.values():
-        diverse_results.extend(hits[:max_per_type])
-
-    return sorted(diverse_results, key=lambda x: x["score"], reverse=True)
-
-
-def postprocess_hits(hits: dict, min_score=0.0, require_inner_hits=False) -> list[dict]:
-    processed = []
-
-    for hit in hits["hits"]["hits"]:
+def pick_cover_page(pages: list[dict]) -> dict | None:
+    """Обложка: приоритетная страница → fallback на любую с картинкой"""
+    cover_page = next(
+        (p for p in pages if p.get("cover_book_page") == 1),
+        next((p for p in pages if p.get("book_page_image")), None)
+    )
+    if cover_page:
+        cover_page = {
+            "page": cover_page.get("book_page"),
+            "image": cover_page.get("book_page_image")
+        }
+    return cover_page
+
+
+def build_result(hit: dict, source: dict, score: float, matched_by: str, highlight: dict,
+                 matched_pages: list[dict], cover_page: dict | None) -> SearchResult:
+    return SearchResult(
+        id=hit["_id"],
+        score=score,
+        matched_by=matched_by,
+        title=source.get("title"),
+        book_name=source.get("book_name"),
+        description=source.get("description") or source.get("referat") or "Нет описания",
+        book_year=source.get("book_year"),
+        lang=source.get("lang"),
+        filter_name=source.get("filter_name"),
+        path_index=source.get("path_index"),
+        pdf_url=source.get("pdf_url"),
+        pdf_opac_001=source.get("pdf_opac_001"),
+        highlight=highlight,
+        matched_pages=matched_pages,
+        cover_page=cover_page,
+        page_count=source.get("page_count"),
+        book_code=source.get("book_code"),
+        book_id=source.get("book_id"),
+        url=f"https://api.electro.nekrasovka.ru/api/books/{source.get('book_id')}/pages/1/img/medium"
+    )
+
+
+def count_matched_pages(hit: dict) -> int:
+    """Число совпавших страниц без сборки сниппетов"""
+    return sum(len(inner.get("hits", {}).get("hits", [])) for inner in (hit.get("inner_hits") or {}).values())
+
+
+def boosted_score(hit: dict, score: float) -> float:
+    """Итоговый скор клиентского ранжирования: бонусы за плотные совпадения по страницам
+    и за количество выделенных слов в заголовке"""
+    # Буст за плотные совпадения (если matched_pages много)
+    if count_matched_pages(hit) >= 2:
+        score += DENSE_PAGES_BONUS
+
+    # Буст за совпадения в заголовке - но только если это качественные совпадения
+    highlight = hit.get("highlight") or {}
+    title_highlight = highlight.get("title")
+    book_highlight = highlight.get("book_name")
+    if title_highlight or book_highlight:
+        combined_highlight = " ".join((title_highlight or []) + (book_highlight or [])).lower()
+        # Считаем количество уникальных выделенных слов
+        highlighted_words = {word.strip() for word in EM_RE.findall(combined_highlight)}
+        if len(highlighted_words) >= 2:
+            score += TITLE_MULTI_WORD_BONUS
+        elif len(highlighted_words) == 1:
+            score += TITLE_SINGLE_WORD_BONUS
+
+    return score
+
+
+def score_candidates(hits: list[dict], min_score=0.0, require_inner_hits=False, apply_boosts=True) -> list[dict]:
+    """Лёгкие кандидаты {"score", "path_index", "hit"} в порядке входа.
+    Сниппеты, обложка и URL собираются потом, в materialize — только для отобранных.
+    apply_boosts=False — скор уже итоговый (серверное ранжирование, build_combined_query)."""
+    candidates = []
+    for hit in hits:
         if require_inner_hits and "inner_hits" not in hit:
             continue
 
-        score = float(hit.get("_score", 0.0))
+        score = float(hit.get("_score") or 0.0)
         if score < min_score:
             continue
-
-        source = hit.get("_source", {})
-        matched_by = source.get("matched_by", "flat")
-        highlight = hit.get("highlight", {})
-        matched_pages = extract_matched_pages(hit)
-
-        # 🔍 Обложка: приоритетная страница → fallback на любую с картинкой
-        cover_page = next(
-            (p for p in source.get("pages", []) if p.get("cover_book_page") == 1),
-            next((p for p in source.get("pages", []) if p.get("book_page_image")), None)
-        )
-        if cover_page:
-            cover_page = {
-                "page": cover_page.get("book_page"),
-                "image": cover_page.get("book_page_image")
-            }
-
-        # Буст за плотные совпадения (если matched_pages много)
-        if len(matched_pages) >= 2:
-            score += 40.0
-            
-                # Анализируем качество совпадений
-        title_text = hit.get("title", "").lower()
-        book_name_text = hit.get("book_name", "").lower()
-        
-        # Буст за совпадения в заголовке - но только если это качественные совпадения
-        if highlight.get("title") or highlight.get("book_name"):
-            # Проверяем, сколько слов из highlight реально совпадает
-            title_highlight = " ".join(highlight.get("title", []))
-            book_highlight = " ".join(highlight.get("book_name", []))
-            combined_highlight = (title_highlight + " " + book_highlight).lower()
-            
-            # Считаем количество уникальных выделенных слов
-            highlighted_words = set()
-            import re
-            for word in re.findall(r'<em>(.*?)</em>', combined_highlight):
-                highlighted_words.add(word.strip())
-            
-            if len(highlighted_words) >= 2:  # Если выделено 2+ слов
-                score += 80.0  # Хороший буст за множественные совпадения
-            elif len(highlighted_words) == 1:
-                score += 30.0  # Меньший буст за одиночные совпадения
-
-        # Дополнительный буст за совпадения в тексте страниц
-        if matched_by in ["nested", "both"] and matched_pages:
-            # Анализируем качество совпадений в тексте
-            text_quality_score = 0
-            for page in matched_pages:
-                page_highlight = page.get("highlight", {}).get("pages.book_page_text", [])
-                if page_highlight:
-                    page_text = " ".join(page_highlight).lower()
-                    # Считаем выделенные слова в тексте
-                    text_highlighted_words = set()
-                    for word in re.findall(r'<em>(.*?)</em>', page_text):
-                        text_highlighted_words.add(word.strip())
-                    
-                    if len(text_highlighted_words) >= 2:
-                        text_quality_score += 100.0  # Высокий буст за полные совпадения в тексте
-                    elif len(text_highlighted_words) == 1:
-                        text_quality_score += 40.0
-            
-            score += min(text_quality_score, 200.0)  # Ограничиваем максимальный буст
-
-        processed.append({
-            "title": source.get("title"),
-            "book_name": source.get("book_name"),
-            "description": source.get("description") or source.get("referat") or "Нет описания",
-            "book_year": source.get("book_year"),
-            "lang": source.get("lang"),
-            "filter_name": source.get("filter_name"),
-            "path_index": source.get("path_index"),
-            "pdf_url": source.get("pdf_url"),
-            "pdf_opac_001": source.get("pdf_opac_001"),
-            "id": hit["_id"],
-            "score": score,
-            "matched_by": matched_by,
-            "highlight_fields": list(highlight.keys()),
-            "highlight": highlight,
-            "matched_pages": matched_pages,
-            "cover_page": cover_page,
-            "book_code": source.get("book_code"),
-            "book_id": source.get("book_id"),
-            "url": f"https://api.electro.nekrasovka.ru/api/books/{source.get('book_id')}/pages/1/img/medium"
-        })
-
-    return sorted(processed, key=lambda x: x["score"], reverse=True)
+        if apply_boosts:
+            score = boosted_score(hit, score)
+
+        candidates.append({"score": score, "path_index": hit.get("_source", {}).get("path_index"), "hit": hit})
+    return candidates
+
+
+def materialize(candidate: dict) -> SearchResult:
+    """Полная запись результата для выдачи"""
+    hit = candidate["hit"]
+    source = hit.get("_source", {})
+    # 🔍 Обложка считается при загрузке; pages — только для старых документов
+    cover_page = source.get("cover_page") or pick_cover_page(source.get("pages", []))
+    return build_result(
+        hit, source, candidate["score"], source.get("matched_by", "flat"),
+        hit.get("highlight", {}), extract_matched_pages(hit), cover_page
+    )
+
+
+def postprocess_hits(hits: dict, min_score=0.0, require_inner_hits=False, apply_boosts=True) -> list[SearchResult]:
+    """Все хиты ответа OpenSearch как результаты выдачи, по убыванию скора"""
+    candidates = score_candidates(hits["hits"]["hits"], min_score, require_inner_hits, apply_boosts)
+    candidates.sort(key=lambda c: c["score"], reverse=True)
+    return [materialize(c) for c in candidates]
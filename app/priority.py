@@ -0,0 +1,118 @@
+# app/priority.py
+"""
+Классы приоритета запросов к OpenSearch.
+interactive — пользовательский /search, batch — /search/batch, diagnostic — /test-search.
+У каждого класса свой пул соединений и свой лимит одновременных запросов;
+batch и diagnostic перед каждым запросом уступают более приоритетным классам,
+пока те ждут в очереди (но не дольше settings.priority_max_yield).
+Класс запроса хранится в contextvar и выставляется обработчиком эндпоинта.
+"""
+
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from app.admission import search_limiter
+from app.config import settings
+from app.latency import LatencyStats
+from app.opensearch_client import async_client, batch_async_client, diagnostic_async_client
+
+INTERACTIVE = "interactive"
+BATCH = "batch"
+DIAGNOSTIC = "diagnostic"
+
+YIELD_POLL_INTERVAL = 0.05
+
+current_priority: ContextVar[str] = ContextVar("current_priority", default=INTERACTIVE)
+
+
+class PriorityClass:
+    def __init__(self, name: str, rank: int, client, concurrency: Optional[int]):
+        self.name = name
+        self.rank = rank
+        self.client = client
+        # interactive ограничивается контролем допуска (app.admission)
+        self.semaphore = asyncio.Semaphore(concurrency) if concurrency else None
+        self.in_flight = 0
+        self.waiting = 0
+        self.yielded = 0
+        self.wait_time = LatencyStats()
+        self.opensearch_latency = LatencyStats()
+        self.request_latency = LatencyStats()
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "yielded": self.yielded,
+            "wait_time": self.wait_time.stats(),
+            "opensearch_latency": self.opensearch_latency.stats(),
+            "request_latency": self.request_latency.stats(),
+        }
+
+
+class PriorityScheduler:
+    def __init__(self, classes: list[PriorityClass]):
+        self.classes = {cls.name: cls for cls in classes}
+
+    def current(self) -> PriorityClass:
+        return self.classes[current_priority.get()]
+
+    def _higher_priority_pending(self, cls: PriorityClass) -> bool:
+        for other in self.classes.values():
+            if other.rank >= cls.rank:
+                continue
+            if other.name == INTERACTIVE:
+                if search_limiter.queue_depth or search_limiter.saturated:
+                    return True
+            elif other.waiting:
+                return True
+        return False
+
+    @asynccontextmanager
+    async def gate(self):
+        """Обёртка вызова OpenSearch: очередь класса, уступка старшим классам, замер задержки"""
+        cls = self.current()
+        start = time.monotonic()
+        if cls.semaphore is not None:
+            cls.waiting += 1
+            try:
+                give_up_at = start + settings.priority_max_yield
+                if self._higher_priority_pending(cls):
+                    cls.yielded += 1
+                while self._higher_priority_pending(cls) and time.monotonic() < give_up_at:
+                    await asyncio.sleep(YIELD_POLL_INTERVAL)
+                await cls.semaphore.acquire()
+            finally:
+                cls.waiting -= 1
+            cls.wait_time.observe(time.monotonic() - start)
+
+        cls.in_flight += 1
+        call_start = time.monotonic()
+        try:
+            yield cls.client
+        finally:
+            cls.in_flight -= 1
+            cls.opensearch_latency.observe(time.monotonic() - call_start)
+            if cls.semaphore is not None:
+                cls.semaphore.release()
+
+    def record_request(self, seconds: float):
+        self.current().request_latency.observe(seconds)
+
+    def stats(self) -> dict:
+        return {name: cls.stats() for name, cls in self.classes.items()}
+
+
+priority_scheduler = PriorityScheduler([
+    PriorityClass(INTERACTIVE, 0, async_client, None),
+    PriorityClass(BATCH, 1, batch_async_client, settings.batch_concurrency),
+    PriorityClass(DIAGNOSTIC, 2, diagnostic_async_client, settings.diagnostic_concurrency),
+])
+
+
+def search_client():
+    """Клиент OpenSearch с пулом соединений класса текущего запроса"""
+    return priority_scheduler.current().client
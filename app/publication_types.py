@@ -0,0 +1,117 @@
+# app/publication_types.py
+"""
+Разбор типа издания в запросе.
+Одна общая таблица ключевых слов компилируется в автомат Ахо–Корасик:
+за один проход по запросу находятся все типы и вырезаются слова типа.
+Совпадения учитывают границы слов ("план" не находится в "планета"),
+поэтому стоимость разбора не растёт с размером таблицы.
+"""
+
+from collections import deque
+from dataclasses import dataclass
+
+PUBLICATION_TYPES = {
+    'книга': ['книга', 'книги', 'том', 'тома', 'издание', 'сочинения'],
+    'журнал': ['журнал', 'журналы', 'номер', '№', 'выпуск'],
+    'газета': ['газета', 'газеты', 'ведомости', 'известия', 'правда'],
+    'открытка': ['открытка', 'открытки', 'почтовая'],
+    'спички': ['спички', 'спичечная', 'этикетка'],
+    'плакат': ['плакат', 'плакаты', 'афиша'],
+    'карта': ['карта', 'карты', 'план', 'атлас'],
+}
+
+
+@dataclass(frozen=True)
+class ParsedQuery:
+    publication_types: list[str]
+    clean_query: str
+
+
+class KeywordAutomaton:
+    """Автомат Ахо–Корасик над таблицей {тип: [ключевые слова]}"""
+
+    def __init__(self, table: dict[str, list[str]]):
+        self.type_order = {pub_type: i for i, pub_type in enumerate(table)}
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail: list[int] = [0]
+        self._out: list[list[tuple[int, str, bool, bool]]] = [[]]
+
+        for pub_type, keywords in table.items():
+            for keyword in keywords:
+                self._add(keyword.lower(), pub_type)
+        self._build_fail_links()
+
+    def _add(self, keyword: str, pub_type: str):
+        state = 0
+        for char in keyword:
+            nxt = self._goto[state].get(char)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][char] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            state = nxt
+        # Границу слова проверяем только у "буквенных" краёв: '№' может стоять вплотную к цифрам
+        self._out[state].append((len(keyword), pub_type, keyword[0].isalnum(), keyword[-1].isalnum()))
+
+    def _build_fail_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[nxt] = self._goto[fallback].get(char, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def find(self, text: str) -> list[tuple[int, int, str]]:
+        """Все совпадения по границам слов: (start, end, тип)"""
+        matches = []
+        state = 0
+        goto, fail, out = self._goto, self._fail, self._out
+        n = len(text)
+        for i, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for length, pub_type, check_start, check_end in out[state]:
+                start, end = i - length + 1, i + 1
+                if check_start and start > 0 and text[start - 1].isalnum():
+                    continue
+                if check_end and end < n and text[end].isalnum():
+                    continue
+                matches.append((start, end, pub_type))
+        return matches
+
+    def parse(self, query: str) -> ParsedQuery:
+        lowered = query.lower()
+        # lower() может менять длину строки (редкие символы) — тогда режем по нижнему регистру
+        source = query if len(lowered) == len(query) else lowered
+        matches = self.find(lowered)
+
+        found = {pub_type for _, _, pub_type in matches}
+        types = sorted(found, key=self.type_order.__getitem__)
+
+        # Вырезаем самые левые-длинные непересекающиеся совпадения
+        matches.sort(key=lambda m: (m[0], -(m[1] - m[0])))
+        parts = []
+        position = 0
+        for start, end, _ in matches:
+            if start < position:
+                continue
+            parts.append(source[position:start])
+            position = end
+        parts.append(source[position:])
+
+        clean_query = " ".join("".join(parts).split())
+        return ParsedQuery(publication_types=types, clean_query=clean_query or query)
+
+
+publication_parser = KeywordAutomaton(PUBLICATION_TYPES)
+
+
+def parse_publication_query(query: str) -> ParsedQuery:
+    return publication_parser.parse(query)
@@ -0,0 +1,85 @@
+# app/query_understanding.py
+"""
+Варианты запроса: транслитерация и смена раскладки.
+Все таблицы компилируются один раз при импорте в таблицы str.translate
+(транслитерация — с многосимвольными заменами), результаты для
+нормализованного запроса мемоизируются в ограниченном LRU.
+"""
+
+from dataclasses import dataclass
+from functools import lru_cache
+
+RUS_ALPHABET = "абвгдеёжзийклмнопрстуфхцчшщъыьэюя"
+
+RUS_TO_ENG = {
+    "а": "a", "б": "b", "в": "v", "г": "g", "д": "d", "е": "e", "ё": "yo",
+    "ж": "zh", "з": "z", "и": "i", "й": "y", "к": "k", "л": "l", "м": "m",
+    "н": "n", "о": "o", "п": "p", "р": "r", "с": "s", "т": "t", "у": "u",
+    "ф": "f", "х": "kh", "ц": "ts", "ч": "ch", "ш": "sh", "щ": "shch", "ъ": "",
+    "ы": "y", "ь": "", "э": "e", "ю": "yu", "я": "ya",
+}
+
+ENG_TO_RUS = {
+    "a": "а", "b": "б", "c": "ц", "d": "д", "e": "е", "f": "ф", "g": "г",
+    "h": "х", "i": "и", "j": "й", "k": "к", "l": "л", "m": "м", "n": "н",
+    "o": "о", "p": "п", "q": "к", "r": "р", "s": "с", "t": "т", "u": "у",
+    "v": "в", "w": "в", "x": "кс", "y": "й", "z": "з",
+}
+
+ENG_KEYS = """qwertyuiop[]asdfghjkl;'zxcvbnm,./`QWERTYUIOP{}ASDFGHJKL:"ZXCVBNM<>?~йцукенгшщзхъфывапролджэячсмитьбюёЙЦУКЕНГШЩЗХЪФЫВАПРОЛДЖЭЯЧСМИТЬБЮЁ"""
+RUS_KEYS = """йцукенгшщзхъфывапролджэячсмитьбю.ёЙЦУКЕНГШЩЗХЪФЫВАПРОЛДЖЭЯЧСМИТЬБЮ,Ёqwertyuiop[]asdfghjkl;'zxcvbnm,.`QWERTYUIOP{}ASDFGHJKL:"ZXCVBNM<>~"""
+
+# Скомпилированные таблицы
+_DELETE_RUS = str.maketrans("", "", RUS_ALPHABET)
+_RUS_TO_ENG = str.maketrans(RUS_TO_ENG)
+_ENG_TO_RUS = str.maketrans(ENG_TO_RUS)
+_LAYOUT = dict(zip(map(ord, ENG_KEYS), RUS_KEYS, strict=False))
+
+
+def is_rus_language(phrase: str) -> bool:
+    # Все символы русские ⇔ после удаления русских букв ничего не осталось
+    return not phrase.lower().translate(_DELETE_RUS)
+
+
+def transliterate(query: str) -> str:
+    table = _RUS_TO_ENG if is_rus_language(query) else _ENG_TO_RUS
+    return query.lower().translate(table)
+
+
+def local_changer(query: str) -> str:
+    return query.translate(_LAYOUT)
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.split())
+
+
+@dataclass(frozen=True)
+class QueryVariants:
+    query: str
+    transliterated: str
+    layout_changed: str
+
+
+@lru_cache(maxsize=10000)
+def _variants(normalized: str) -> QueryVariants:
+    return QueryVariants(
+        query=normalized,
+        transliterated=transliterate(normalized),
+        layout_changed=local_changer(normalized)
+    )
+
+
+def query_variants(query: str) -> QueryVariants:
+    """Варианты одного запроса (мемоизируются по нормализованному запросу)"""
+    return _variants(normalize_query(query))
+
+
+def query_variants_batch(queries: list[str]) -> list[QueryVariants]:
+    """Варианты для списка запросов; повторы внутри пачки считаются один раз"""
+    unique = {q: query_variants(q) for q in dict.fromkeys(queries)}
+    return [unique[q] for q in queries]
+
+
+def variants_cache_info():
+    return _variants.cache_info()
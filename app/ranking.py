@@ -0,0 +1,63 @@
+# app/ranking.py
+"""
+Слияние flat/nested хитов и отбор итоговой выдачи за один проход.
+merge_candidates объединяет хиты по _id без сортировки, select_top держит
+для каждого path_index кучу из max_per_type лучших и затем берёт top-K
+из выживших: O(n log max_per_type + s log k) вместо трёх полных сортировок
+(merge_hits → postprocess_hits → apply_diversity).
+Множители merge_hits по matched_by влияли только на промежуточный порядок —
+итоговый score считает postprocess_hits, поэтому здесь их нет
+(серверное ранжирование по-прежнему использует MATCHED_BY_WEIGHTS).
+"""
+
+import heapq
+from typing import Optional
+
+# diversity: сколько результатов одного path_index попадает в выдачу
+MAX_PER_TYPE = 6
+
+
+def merge_candidates(flat_hits: list[dict], nested_hits: list[dict]) -> list[dict]:
+    """Хиты обоих запросов по одному на _id, с _source.matched_by; порядок — порядок слияния"""
+    combined: dict[str, dict] = {}
+    for hit in flat_hits:
+        hit["_source"]["matched_by"] = "flat"
+        combined[hit["_id"]] = hit
+
+    for hit in nested_hits:
+        existing = combined.get(hit["_id"])
+        if existing is not None:
+            # добавляем inner_hits (без них, если страницы грузятся лениво)
+            if "inner_hits" in hit:
+                existing["inner_hits"] = hit["inner_hits"]
+            existing["_source"]["matched_by"] = "both"
+        else:
+            # кладём в _source, чтобы постпроцесс и UI его увидели
+            hit["_source"]["matched_by"] = "nested"
+            combined[hit["_id"]] = hit
+
+    return list(combined.values())
+
+
+def select_top(results: list[dict], max_per_type: Optional[int] = None, k: Optional[int] = None) -> list[dict]:
+    """Лучшие по score результаты (или кандидаты postprocess_hits.score_candidates): не больше max_per_type на path_index и не больше k всего.
+    При равном score выше тот, что раньше в results."""
+    if max_per_type is not None:
+        groups: dict = {}
+        for seq, item in enumerate(results):
+            # -seq: уникален, поэтому словари в кортежах никогда не сравниваются
+            entry = (item["score"], -seq, item)
+            heap = groups.setdefault(item.get("path_index", "unknown"), [])
+            if len(heap) < max_per_type:
+                heapq.heappush(heap, entry)
+            elif heap and entry > heap[0]:
+                heapq.heapreplace(heap, entry)
+        survivors = [entry for heap in groups.values() for entry in heap]
+    else:
+        survivors = [(item["score"], -seq, item) for seq, item in enumerate(results)]
+
+    if k is not None and k < len(survivors):
+        top = heapq.nlargest(k, survivors)
+    else:
+        top = sorted(survivors, reverse=True)
+    return [item for _, _, item in top]
@@ -0,0 +1,66 @@
+# app/result_model.py
+"""
+Компактная модель результата /search.
+SearchResult — dataclass со slots: без словаря на каждый экземпляр,
+orjson сериализует его напрямую. highlight_fields больше не отдаётся —
+это ключи highlight. Параметр fields= оставляет в ответе только нужные
+клиенту поля (id — всегда).
+"""
+
+from dataclasses import dataclass, fields as dataclass_fields
+from typing import Any, Optional
+
+
+@dataclass(slots=True)
+class SearchResult:
+    id: str
+    score: float
+    matched_by: str
+    title: Optional[str] = None
+    book_name: Optional[str] = None
+    description: Optional[str] = None
+    book_year: Any = None
+    lang: Optional[str] = None
+    filter_name: Optional[str] = None
+    path_index: Optional[str] = None
+    pdf_url: Optional[str] = None
+    pdf_opac_001: Optional[str] = None
+    highlight: Optional[dict] = None
+    matched_pages: Optional[list] = None
+    cover_page: Optional[dict] = None
+    page_count: Optional[int] = None
+    book_code: Optional[str] = None
+    book_id: Any = None
+    url: Optional[str] = None
+
+    # Доступ как к словарю — для кода, написанного под dict-результаты (автотесты, метрики)
+    def __getitem__(self, name: str) -> Any:
+        return getattr(self, name)
+
+    def get(self, name: str, default: Any = None) -> Any:
+        return getattr(self, name, default)
+
+    def to_dict(self, only: Optional[frozenset] = None) -> dict:
+        names = RESULT_FIELDS if only is None else [name for name in RESULT_FIELDS if name in only]
+        return {name: getattr(self, name) for name in names}
+
+
+RESULT_FIELDS = tuple(field.name for field in dataclass_fields(SearchResult))
+
+
+def parse_fields(value: Optional[str]) -> Optional[frozenset]:
+    """fields=title,score,... → множество полей; ValueError на неизвестное поле"""
+    if not value:
+        return None
+    requested = {name.strip() for name in value.split(",") if name.strip()}
+    unknown = requested - set(RESULT_FIELDS)
+    if unknown:
+        raise ValueError(f"Неизвестные поля: {', '.join(sorted(unknown))}; доступны: {', '.join(RESULT_FIELDS)}")
+    return frozenset(requested | {"id"})
+
+
+def project(response: dict, only: Optional[frozenset]) -> dict:
+    """Ответ с результатами, урезанными до полей only"""
+    if only is None or "results" not in response:
+        return response
+    return {**response, "results": [result.to_dict(only) for result in response["results"]]}
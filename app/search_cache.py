@@ -0,0 +1,158 @@
+# app/search_cache.py
+"""
+In-process кэш результатов /search.
+LRU по памяти + TTL, счётчики попаданий/промахов.
+Записи индекса сбрасываются, когда меняется его "поколение"
+(uuid индекса + число refresh и документов) — после переиндексации
+устаревшие результаты не отдаются.
+"""
+
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+from app.config import settings
+from app.fast_json import dumps
+from app.logger_config import setup_logger
+
+logger = setup_logger("search_cache")
+
+
+def make_search_key(index: str, q: str, start_year=None, end_year=None, search_mode: str = "both", **extra) -> tuple:
+    """Нормализованный ключ запроса: регистр и лишние пробелы не влияют на попадание"""
+    normalized_q = " ".join(q.lower().split())
+    return (index, normalized_q, start_year, end_year, search_mode) + tuple(sorted(extra.items()))
+
+
+class SearchCache:
+    """LRU-кэш с TTL и ограничением по суммарному размеру значений"""
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, ttl: float = 300.0):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries: OrderedDict[tuple, tuple[float, int, Any]] = OrderedDict()
+        self._generations: dict[str, Any] = {}
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def check_generation(self, index: str, generation: Any):
+        """Сбрасывает записи индекса, если его поколение изменилось"""
+        if generation is None:
+            return
+        previous = self._generations.get(index)
+        self._generations[index] = generation
+        if previous is not None and previous != generation:
+            logger.info(f"♻️ Индекс {index} изменился ({previous} → {generation}), сбрасываем кэш")
+            self.invalidate(index)
+
+    def get(self, key: tuple) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        expires_at, size, value = entry
+        if expires_at < time.monotonic():
+            self._drop(key)
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key: tuple, value: Any, generation: Any = None):
+        """generation — поколение индекса на старте поиска; если оно успело смениться,
+        результат мог посчитаться по старым данным и не сохраняется"""
+        if generation is not None and self._generations.get(key[0]) != generation:
+            return
+
+        size = len(dumps(value))
+        if size > self.max_bytes:
+            return
+
+        if key in self._entries:
+            self._drop(key)
+
+        self._entries[key] = (time.monotonic() + self.ttl, size, value)
+        self.current_bytes += size
+
+        while self.current_bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._drop(oldest)
+            self.evictions += 1
+
+    def invalidate(self, index: Optional[str] = None):
+        """Удаляет все записи (или только записи указанного индекса)"""
+        keys = [k for k in self._entries if index is None or k[0] == index]
+        for key in keys:
+            self._drop(key)
+        self.invalidations += 1
+
+    def _drop(self, key: tuple):
+        _, size, _ = self._entries.pop(key)
+        self.current_bytes -= size
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.current_bytes,
+            "max_bytes": self.max_bytes,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+class IndexGenerationTracker:
+    """Периодически опрашивает _stats индекса и возвращает маркер его поколения.
+
+    Маркер меняется по refresh, а не по индексации: проиндексированные документы
+    видны поиску только после refresh, иначе кэш сохранял бы под новым поколением
+    ответы, посчитанные по старым данным.
+    """
+
+    def __init__(self, client, check_interval: float = 5.0):
+        self.client = client
+        self.check_interval = check_interval
+        self._cached: dict[str, tuple[float, Any]] = {}
+
+    async def get(self, index: str) -> Any:
+        now = time.monotonic()
+        cached = self._cached.get(index)
+        if cached and now - cached[0] < self.check_interval:
+            return cached[1]
+
+        try:
+            stats = await self.client.indices.stats(index=index, metric="docs,refresh")
+        except Exception as e:
+            logger.warning(f"⚠️ Не удалось получить поколение индекса {index}: {e}")
+            # Неудачу тоже помним на check_interval: без прав на _stats не опрашиваем его в каждом запросе
+            self._cached[index] = (now, None)
+            return None
+
+        generation = tuple(sorted(
+            (
+                name,
+                data.get("uuid"),
+                # external_total — refresh, после которых меняется то, что видит поиск
+                data["primaries"]["refresh"].get("external_total", data["primaries"]["refresh"]["total"]),
+                data["primaries"]["docs"]["count"],
+            )
+            for name, data in stats.get("indices", {}).items()
+        ))
+        self._cached[index] = (now, generation)
+        return generation
+
+
+search_cache = SearchCache(
+    max_bytes=settings.search_cache_max_mb * 1024 * 1024,
+    ttl=settings.search_cache_ttl
+)
@@ -0,0 +1,119 @@
+# app/search_templates.py
+"""
+Хранимые search templates для flat и nested запросов.
+Тела из build_flat_query/build_nested_query один раз превращаются в
+mustache-шаблоны и регистрируются в кластере; на каждый поиск уходят
+только id шаблона и параметры (текст запроса, годы, размер).
+id содержит хэш тела, поэтому при деплое с изменёнными запросами
+регистрируются новые шаблоны, а старые воркеры продолжают работать со своими.
+Если регистрация не удалась, поиск идёт обычными inline-телами.
+Регистрация при деплое: python -m app.search_templates
+"""
+
+import asyncio
+import hashlib
+import json
+from typing import Optional
+
+from app.build_query import build_flat_query, build_nested_query
+from app.config import settings
+from app.logger_config import setup_logger
+
+logger = setup_logger("search_templates")
+
+QUERY_SENTINEL = "__necrasovka_query__"
+SIZE_SENTINEL = "__necrasovka_size__"
+START_SENTINEL = "__necrasovka_start__"
+END_SENTINEL = "__necrasovka_end__"
+
+BUILDERS = {
+    "flat": build_flat_query,
+    "nested": build_nested_query,
+}
+
+
+def template_shape() -> dict:
+    """Настройки, от которых зависит форма тела (но не параметры)"""
+    return {
+        "use_subfields": settings.search_variant_subfields,
+        "inner_hits": not settings.search_lazy_page_hits,
+    }
+
+
+def render_template_source(name: str, with_years: bool, shape: dict) -> str:
+    kwargs = {"use_subfields": shape["use_subfields"], "size": SIZE_SENTINEL}
+    if name == "nested":
+        kwargs["inner_hits"] = shape["inner_hits"]
+    body = BUILDERS[name](
+        [QUERY_SENTINEL],
+        START_SENTINEL if with_years else None,
+        END_SENTINEL if with_years else None,
+        **kwargs
+    )
+    source = json.dumps(body, ensure_ascii=False, separators=(",", ":"))
+    # Строки-маркеры → mustache; toJson экранирует текст запроса как JSON-строку
+    return (source
+            .replace(f'"{QUERY_SENTINEL}"', "{{#toJson}}query{{/toJson}}")
+            .replace(f'"{SIZE_SENTINEL}"', "{{size}}")
+            .replace(START_SENTINEL, "{{start_year}}")
+            .replace(END_SENTINEL, "{{end_year}}"))
+
+
+class SearchTemplates:
+    def __init__(self):
+        self._ids: dict[tuple[str, bool], str] = {}
+        self._shape: Optional[dict] = None
+
+    @property
+    def ready(self) -> bool:
+        return bool(self._ids) and self._shape == template_shape()
+
+    def compile(self) -> dict[tuple[str, bool], tuple[str, str]]:
+        shape = template_shape()
+        compiled = {}
+        for name in BUILDERS:
+            for with_years in (False, True):
+                source = render_template_source(name, with_years, shape)
+                digest = hashlib.sha1(source.encode("utf-8")).hexdigest()[:12]
+                template_id = f"necrasovka-{name}{'-years' if with_years else ''}-{digest}"
+                compiled[(name, with_years)] = (template_id, source)
+        return compiled
+
+    async def register(self, client) -> bool:
+        compiled = self.compile()
+        try:
+            for template_id, source in compiled.values():
+                await client.put_script(id=template_id, body={"script": {"lang": "mustache", "source": source}})
+        except Exception as e:
+            logger.warning(f"⚠️ Не удалось зарегистрировать search templates, используем inline-запросы: {e}")
+            self._ids = {}
+            return False
+
+        self._ids = {key: template_id for key, (template_id, _) in compiled.items()}
+        self._shape = template_shape()
+        logger.info(f"📐 Search templates зарегистрированы: {sorted(self._ids.values())}")
+        return True
+
+    def request(self, name: str, query_list: list[str], start_year=None, end_year=None, size: int = 50) -> Optional[dict]:
+        """Тело search_template ({"id", "params"}) или None, если нужен inline-запрос"""
+        if not self.ready:
+            return None
+        with_years = bool(start_year and end_year)
+        params = {"query": " ".join(query_list), "size": size}
+        if with_years:
+            params.update(start_year=start_year, end_year=end_year)
+        return {"id": self._ids[(name, with_years)], "params": params}
+
+
+search_templates = SearchTemplates()
+
+
+if __name__ == "__main__":
+    from app.opensearch_client import async_client
+
+    async def main():
+        ok = await search_templates.register(async_client)
+        await async_client.close()
+        return ok
+
+    raise SystemExit(0 if asyncio.run(main()) else 1)
@@ -6,14 +6,10 @@
 import asyncio
 import json
 import time
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Tuple, Optional, Callable
 from dataclasses import dataclass
-from app.opensearch_client import client
-from app.build_query import build_flat_query, build_nested_query
-from app.main import merge_hits
-from app.postprocess_hits import postprocess_hits, apply_diversity
-from app.utils import coalesce, transliterate, local_changer, detect_publication_type, extract_clean_query
-from app.typo_client import fix_typo
+from app.main import rank_hits, fetch_hits, build_query_list
+from app.publication_types import parse_publication_query
 from app.logger_config import setup_logger
 from app.search_metrics import AdvancedSearchEvaluator, SearchMetrics, format_metrics_report
 
@@ -205,21 +201,15 @@ class SearchQualityTester:
         
         try:
             # Обработка запроса как в main.py
-            publication_types = detect_publication_type(query)
-            clean_query = extract_clean_query(query)
-            query_list = coalesce(clean_query, transliterate(clean_query), local_changer(clean_query), fix_typo(clean_query))
+            parsed = parse_publication_query(query)
+            publication_types, clean_query = parsed.publication_types, parsed.clean_query
+            query_list = await build_query_list(clean_query)
             
-            # Выполнение поисковых запросов
-            flat_query = build_flat_query(query_list, None, None)
-            nested_query = build_nested_query(query_list, None, None)
-            
-            flat_resp = client.search(index=self.index_name, body=flat_query)
-            nested_resp = client.search(index=self.index_name, body=nested_query)
+            # Выполнение поисковых запросов (параллельно, как в main.py)
+            flat_hits, nested_hits = await fetch_hits(self.index_name, query_list, None, None)
             
             # Объединение результатов
-            combined_hits = merge_hits(flat_resp["hits"]["hits"], nested_resp["hits"]["hits"])
-            results = postprocess_hits({"hits": {"hits": combined_hits}}, require_inner_hits=False)
-            results = apply_diversity(results, max_per_type=6)
+            results = rank_hits(flat_hits, nested_hits)
             
             execution_time = time.time() - start_time
             return results, execution_time
@@ -327,8 +317,9 @@ class SearchQualityTester:
         
         return test_result
     
-    async def run_all_tests(self) -> Dict[str, Any]:
-        """Выполняет все тесты и возвращает сводную статистику"""
+    async def run_all_tests(self, progress: Optional[Callable[[int, int], None]] = None) -> Dict[str, Any]:
+        """Выполняет все тесты и возвращает сводную статистику.
+        progress(выполнено, всего) вызывается после каждого теста"""
         logger.info("🧪 Запуск автотестов системы поиска...")
         start_time = time.time()
         
@@ -336,6 +327,8 @@ class SearchQualityTester:
         for test_case in TEST_CASES:
             result = await self.run_test(test_case)
             self.results.append(result)
+            if progress is not None:
+                progress(len(self.results), len(TEST_CASES))
         
         total_time = time.time() - start_time
         
@@ -460,10 +453,10 @@ class SearchQualityTester:
         print(f"\n🎯 Общая оценка системы поиска: {grade}")
         print("="*80)
 
-async def run_search_tests():
+async def run_search_tests(progress: Optional[Callable[[int, int], None]] = None):
     """Основная функция для запуска тестов"""
     tester = SearchQualityTester()
-    summary = await tester.run_all_tests()
+    summary = await tester.run_all_tests(progress)
     tester.print_results(summary)
     return summary
 
@@ -0,0 +1,64 @@
+# app/singleflight.py
+"""
+Single-flight: одновременные одинаковые запросы разделяют одно вычисление.
+Первый запрос по ключу запускает задачу, остальные ждут её результат.
+Вычисление отменяется, только когда ушли все ожидающие.
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Hashable
+
+
+class SingleFlight:
+    def __init__(self):
+        self._inflight: dict[Hashable, asyncio.Task] = {}
+        self._waiters: dict[asyncio.Task, int] = {}
+        self.calls = 0
+        self.executions = 0
+        self.coalesced = 0
+        self.abandoned = 0
+
+    def _forget(self, key: Hashable, task: asyncio.Task):
+        self._waiters.pop(task, None)
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        self.calls += 1
+        task = self._inflight.get(key)
+        if task is None:
+            self.executions += 1
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            self._waiters[task] = 0
+            task.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            self.coalesced += 1
+
+        self._waiters[task] = self._waiters.get(task, 0) + 1
+        try:
+            # shield: отмена одного из ожидающих не отменяет общее вычисление
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if not task.done() and self._waiters.get(task) == 1:
+                # ушёл последний ожидающий — результат больше никому не нужен
+                self.abandoned += 1
+                task.cancel()
+                self._forget(key, task)
+            raise
+        finally:
+            if task in self._waiters:
+                self._waiters[task] -= 1
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "coalesced_rate": self.coalesced / self.calls if self.calls else 0.0,
+            "in_flight": len(self._inflight),
+            "abandoned": self.abandoned,
+        }
+
+
+search_flight = SingleFlight()
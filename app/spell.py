@@ -0,0 +1,307 @@
+# app/spell.py
+"""
+Встроенный корректор опечаток в стиле SymSpell (symmetric delete).
+
+Офлайн-задача собирает словарь терминов с документной частотой из индекса
+книг или из CSV, которые читает load_to_opensearch.py, и сохраняет его
+компактным бинарным файлом. Воркеры открывают файл через mmap, поэтому
+словарь не копируется в память каждого процесса, а ответы одинаковы
+во всех воркерах.
+
+Формат файла (little-endian):
+    magic "SYMSPEL1"
+    header: max_distance, prefix_length, n_words, n_deletes, words_blob_len (uint32), padding до 8 байт
+    delete_hashes:  n_deletes × uint64  (отсортированы)
+    delete_words:   n_deletes × uint32  (индекс слова для каждого хэша)
+    word_offsets:   (n_words + 1) × uint32
+    word_freqs:     n_words × uint32
+    words_blob:     слова в utf-8 подряд
+
+Сборка:
+    python -m app.spell --from-index my-books-index --out data/spell.dict
+    python -m app.spell --from-csv books.csv data.csv --out data/spell.dict
+"""
+
+import argparse
+import csv
+import hashlib
+import mmap
+import os
+import re
+import struct
+import sys
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from functools import lru_cache
+from typing import Iterable, Optional
+
+MAGIC = b"SYMSPEL1"
+HEADER = struct.Struct("<IIIII")
+HEADER_SIZE = 32  # magic + header, выровнено до 8 байт
+
+TOKEN_RE = re.compile(r"[^\W\d_]+")
+
+
+def tokenize(text: str) -> list[str]:
+    return TOKEN_RE.findall(text.lower())
+
+
+def delete_hash(term: str) -> int:
+    return int.from_bytes(hashlib.blake2b(term.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def generate_deletes(term: str, max_distance: int, prefix_length: int) -> set[str]:
+    """Все строки, получаемые из префикса term удалением до max_distance символов (включая сам префикс)"""
+    prefix = term[:prefix_length]
+    result = {prefix}
+    frontier = {prefix}
+    for _ in range(max_distance):
+        next_frontier = set()
+        for word in frontier:
+            if len(word) <= 1:
+                continue
+            for i in range(len(word)):
+                candidate = word[:i] + word[i + 1:]
+                if candidate not in result:
+                    next_frontier.add(candidate)
+        result |= next_frontier
+        frontier = next_frontier
+    return result
+
+
+def edit_distance(a: str, b: str, max_distance: int) -> int:
+    """Damerau-Levenshtein (OSA) с ранним выходом; max_distance + 1, если больше порога"""
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    prev_prev = None
+    prev = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        row_min = i
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            value = min(prev[j] + 1, current[j - 1] + 1, prev[j - 1] + cost)
+            if (prev_prev is not None and i > 1 and j > 1
+                    and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]):
+                value = min(value, prev_prev[j - 2] + 1)
+            current[j] = value
+            row_min = min(row_min, value)
+        if row_min > max_distance:
+            return max_distance + 1
+        prev_prev, prev = prev, current
+    return prev[-1] if prev[-1] <= max_distance else max_distance + 1
+
+
+# ---------------------------------------------------------------------------
+# Сборка словаря
+# ---------------------------------------------------------------------------
+
+def count_document_frequencies(texts: Iterable[str], min_length: int = 2) -> Counter:
+    """Документная частота: сколько текстов содержат термин"""
+    frequencies = Counter()
+    for text in texts:
+        if text:
+            frequencies.update({t for t in tokenize(text) if len(t) >= min_length})
+    return frequencies
+
+
+def build_dictionary(frequencies: dict[str, int], path: str, max_distance: int = 2,
+                     prefix_length: int = 7, min_count: int = 2):
+    words = sorted(w for w, c in frequencies.items() if c >= min_count)
+
+    entries = set()
+    for idx, word in enumerate(words):
+        for deleted in generate_deletes(word, max_distance, prefix_length):
+            entries.add((delete_hash(deleted), idx))
+    entries = sorted(entries)
+
+    delete_hashes = array("Q", (h for h, _ in entries))
+    delete_words = array("I", (i for _, i in entries))
+    word_freqs = array("I", (min(frequencies[w], 0xFFFFFFFF) for w in words))
+    encoded = [w.encode("utf-8") for w in words]
+    word_offsets = array("I", [0])
+    for chunk in encoded:
+        word_offsets.append(word_offsets[-1] + len(chunk))
+    words_blob = b"".join(encoded)
+
+    if sys.byteorder == "big":
+        for arr in (delete_hashes, delete_words, word_freqs, word_offsets):
+            arr.byteswap()
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        header = MAGIC + HEADER.pack(max_distance, prefix_length, len(words), len(entries), len(words_blob))
+        f.write(header.ljust(HEADER_SIZE, b"\0"))
+        for arr in (delete_hashes, delete_words, word_offsets, word_freqs):
+            arr.tofile(f)
+        f.write(words_blob)
+    # атомарная замена: работающие воркеры продолжают читать старый mmap
+    os.replace(tmp_path, path)
+    return len(words), len(entries)
+
+
+def iter_index_texts(index: str, with_pages: bool = False) -> Iterable[str]:
+    from opensearchpy import helpers
+    from app.opensearch_client import client
+
+    fields = ["title", "book_name", "description", "referat"]
+    if with_pages:
+        fields.append("pages.book_page_text")
+    for doc in helpers.scan(client, index=index, query={"_source": fields}, size=500):
+        source = doc.get("_source", {})
+        yield " ".join(str(source.get(f) or "") for f in fields if "." not in f)
+        if with_pages:
+            for page in source.get("pages") or []:
+                yield page.get("book_page_text") or ""
+
+
+def iter_csv_texts(books_csv: str, pages_csv: Optional[str] = None) -> Iterable[str]:
+    csv.field_size_limit(sys.maxsize)
+    with open(books_csv, encoding="utf-8", newline="") as f:
+        for row in csv.DictReader(f):
+            yield " ".join(row.get(c) or "" for c in ("book_name", "book_author", "description", "referat"))
+    if pages_csv:
+        with open(pages_csv, encoding="utf-8", newline="") as f:
+            for row in csv.DictReader(f):
+                yield row.get("book_page_text_updated") or row.get("book_page_text") or ""
+
+
+# ---------------------------------------------------------------------------
+# Чтение словаря
+# ---------------------------------------------------------------------------
+
+class SymSpellDictionary:
+    """Словарь поверх mmap: поиск кандидатов бинарным поиском по хэшам удалений"""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path}: не словарь SymSpell")
+
+        (self.max_distance, self.prefix_length, self.n_words,
+         self.n_deletes, words_blob_len) = HEADER.unpack_from(self._mmap, len(MAGIC))
+
+        view = memoryview(self._mmap)
+        offset = HEADER_SIZE
+
+        def section(count: int, fmt: str, size: int):
+            nonlocal offset
+            part = view[offset:offset + count * size].cast(fmt)
+            offset += count * size
+            return part
+
+        self.delete_hashes = section(self.n_deletes, "Q", 8)
+        self.delete_words = section(self.n_deletes, "I", 4)
+        self.word_offsets = section(self.n_words + 1, "I", 4)
+        self.word_freqs = section(self.n_words, "I", 4)
+        self.words_blob = view[offset:offset + words_blob_len]
+
+    def word(self, idx: int) -> str:
+        return bytes(self.words_blob[self.word_offsets[idx]:self.word_offsets[idx + 1]]).decode("utf-8")
+
+    def lookup(self, term: str, max_distance: Optional[int] = None) -> Optional[tuple[str, int, int]]:
+        """Лучший кандидат (слово, расстояние, частота) или None"""
+        if max_distance is None:
+            max_distance = self.max_distance
+        max_distance = min(max_distance, self.max_distance)
+
+        best = None
+        seen = set()
+        for deleted in generate_deletes(term, max_distance, self.prefix_length):
+            h = delete_hash(deleted)
+            pos = bisect_left(self.delete_hashes, h)
+            while pos < self.n_deletes and self.delete_hashes[pos] == h:
+                idx = self.delete_words[pos]
+                pos += 1
+                if idx in seen:
+                    continue
+                seen.add(idx)
+                candidate = self.word(idx)
+                distance = edit_distance(term, candidate, max_distance)
+                if distance > max_distance:
+                    continue
+                key = (distance, -self.word_freqs[idx])
+                if best is None or key < best[0]:
+                    best = (key, candidate, distance, self.word_freqs[idx])
+        if best is None:
+            return None
+        return best[1], best[2], best[3]
+
+    @lru_cache(maxsize=50000)
+    def correct_word(self, word: str) -> str:
+        # Короткие слова не трогаем: у них слишком много соседей на расстоянии 1-2
+        if len(word) < 4:
+            return word
+        max_distance = 1 if len(word) < 7 else self.max_distance
+        found = self.lookup(word, max_distance)
+        return found[0] if found else word
+
+    def correct(self, text: str) -> str:
+        """Исправляет слова запроса, сохраняя разделители и регистр.
+        Без исправлений возвращает text как есть — coalesce не продублирует запрос."""
+        return TOKEN_RE.sub(lambda m: self._correct_token(m.group(0)), text)
+
+    def _correct_token(self, token: str) -> str:
+        corrected = self.correct_word(token.lower())
+        if corrected == token.lower():
+            return token
+        if token.isupper() and len(token) > 1:
+            return corrected.upper()
+        if token[0].isupper():
+            return corrected[0].upper() + corrected[1:]
+        return corrected
+
+    def close(self):
+        self.correct_word.cache_clear()
+        self.delete_hashes.release()
+        self.delete_words.release()
+        self.word_offsets.release()
+        self.word_freqs.release()
+        self.words_blob.release()
+        self._mmap.close()
+
+
+@lru_cache(maxsize=1)
+def get_spell_dictionary() -> Optional[SymSpellDictionary]:
+    """Словарь из settings.spell_dictionary_path или None, если он не собран"""
+    from app.config import settings
+
+    path = settings.spell_dictionary_path
+    if not path or not os.path.exists(path):
+        return None
+    return SymSpellDictionary(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сборка словаря SymSpell для встроенного исправления опечаток")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--from-index", metavar="INDEX")
+    source.add_argument("--from-csv", nargs="+", metavar="CSV", help="books.csv [data.csv]")
+    parser.add_argument("--with-pages", action="store_true", help="учитывать текст страниц (только --from-index)")
+    parser.add_argument("--out", default="data/spell.dict")
+    parser.add_argument("--max-distance", type=int, default=2)
+    parser.add_argument("--prefix-length", type=int, default=7)
+    parser.add_argument("--min-count", type=int, default=2)
+    args = parser.parse_args()
+
+    if args.from_index:
+        texts = iter_index_texts(args.from_index, with_pages=args.with_pages)
+    else:
+        texts = iter_csv_texts(*args.from_csv[:2])
+
+    frequencies = count_document_frequencies(texts)
+    n_words, n_deletes = build_dictionary(
+        frequencies, args.out,
+        max_distance=args.max_distance,
+        prefix_length=args.prefix_length,
+        min_count=args.min_count
+    )
+    print(f"✅ Словарь {args.out}: слов={n_words}, удалений={n_deletes}, размер={os.path.getsize(args.out)} байт")
+
+
+if __name__ == "__main__":
+    main()
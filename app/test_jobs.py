@@ -0,0 +1,172 @@
+# app/test_jobs.py
+"""
+Фоновые прогоны автотестов качества поиска (/test-search).
+Эндпоинт ставит прогон в работу и сразу возвращает id задания; прогон идёт
+отдельной задачей asyncio с диагностическим приоритетом, а его ход и итог
+доступны по /test-search/{job_id}.
+
+Состояние заданий пишется в settings.test_jobs_dir, поэтому статус виден
+из любого воркера uvicorn. Идущий прогон держит flock на lock-файле:
+пока он не завершён, повторные запросы из всех воркеров получают то же
+задание — два прогона одновременно не выполняются.
+"""
+
+import asyncio
+import fcntl
+import json
+import os
+import time
+import uuid
+from dataclasses import dataclass, field, asdict
+from typing import Any, Optional
+
+from app.config import settings
+from app.logger_config import setup_logger
+from app.priority import current_priority, priority_scheduler, DIAGNOSTIC
+
+logger = setup_logger("test_jobs")
+
+# Сколько завершённых заданий хранить для опроса статуса
+MAX_FINISHED_JOBS = 20
+LOCK_FILE = "active.lock"
+
+
+class TestJobStarting(Exception):
+    """Другой воркер захватил блокировку, но ещё не записал id задания"""
+
+
+@dataclass
+class TestJob:
+    id: str
+    status: str = "queued"  # queued → running → completed | failed
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    done: int = 0
+    total: Optional[int] = None
+    summary: Optional[dict] = None
+    error: Optional[str] = None
+
+    @property
+    def active(self) -> bool:
+        return self.status in ("queued", "running")
+
+    def to_dict(self) -> dict[str, Any]:
+        end = self.finished_at or time.time()
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "progress": {"done": self.done, "total": self.total},
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "elapsed": round(end - self.started_at, 3) if self.started_at else None,
+            "summary": self.summary,
+            "error": self.error,
+        }
+
+
+class TestJobRunner:
+    def __init__(self, jobs_dir: str):
+        self.jobs_dir = jobs_dir
+        self._lock_fd: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def _path(self, job_id: str) -> str:
+        return os.path.join(self.jobs_dir, f"{job_id}.json")
+
+    def _save(self, job: TestJob):
+        path = self._path(job.id)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(asdict(job), f, ensure_ascii=False, default=str)
+        os.replace(tmp_path, path)
+
+    def get(self, job_id: str) -> Optional[TestJob]:
+        # id приходит из URL — не даём выйти за пределы каталога
+        if not job_id.isalnum():
+            return None
+        try:
+            with open(self._path(job_id), encoding="utf-8") as f:
+                return TestJob(**json.load(f))
+        except FileNotFoundError:
+            return None
+
+    def submit(self) -> tuple[TestJob, bool]:
+        """Запускает прогон или возвращает уже идущий; второй элемент — создан ли новый"""
+        os.makedirs(self.jobs_dir, exist_ok=True)
+        fd = os.open(os.path.join(self.jobs_dir, LOCK_FILE), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            active_id = os.pread(fd, 64, 0).decode().strip()
+            os.close(fd)
+            job = self.get(active_id) if active_id else None
+            if job is None:
+                raise TestJobStarting()
+            return job, False
+
+        job = TestJob(id=uuid.uuid4().hex)
+        self._save(job)
+        os.ftruncate(fd, 0)
+        os.pwrite(fd, job.id.encode(), 0)
+        self._lock_fd = fd
+        self._forget_finished()
+        self._task = asyncio.create_task(self._run(job))
+        return job, True
+
+    def _progress(self, job: TestJob, done: int, total: int):
+        job.done = done
+        job.total = total
+        self._save(job)
+
+    async def _run(self, job: TestJob):
+        from app.search_tests import run_search_tests
+
+        # Диагностика идёт своим пулом и уступает пользовательскому поиску
+        current_priority.set(DIAGNOSTIC)
+        job.status = "running"
+        job.started_at = time.time()
+        self._save(job)
+        logger.info(f"🧪 Автотесты: задание {job.id} запущено")
+        try:
+            job.summary = await run_search_tests(progress=lambda done, total: self._progress(job, done, total))
+            job.status = "completed"
+        except asyncio.CancelledError:
+            job.error = "остановлено при завершении воркера"
+            job.status = "failed"
+            raise
+        except Exception as e:
+            logger.exception(f"❌ Автотесты: задание {job.id} завершилось ошибкой: {e}")
+            job.error = f"{type(e).__name__}: {e}"
+            job.status = "failed"
+        finally:
+            job.finished_at = time.time()
+            self._save(job)
+            self._release()
+            priority_scheduler.record_request(job.finished_at - job.started_at)
+            logger.info(f"🧪 Автотесты: задание {job.id} — {job.status}, {round(job.finished_at - job.started_at, 1)}s")
+
+    def _release(self):
+        self._task = None
+        if self._lock_fd is not None:
+            os.ftruncate(self._lock_fd, 0)
+            fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+            os.close(self._lock_fd)
+            self._lock_fd = None
+
+    def _forget_finished(self):
+        paths = [
+            os.path.join(self.jobs_dir, name)
+            for name in os.listdir(self.jobs_dir) if name.endswith(".json")
+        ]
+        paths.sort(key=os.path.getmtime)
+        for path in paths[:max(0, len(paths) - MAX_FINISHED_JOBS)]:
+            os.remove(path)
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+
+
+test_job_runner = TestJobRunner(settings.test_jobs_dir)
@@ -1,12 +1,167 @@
-import requests
+# app/typo_client.py
+"""
+Исправление опечаток: встроенный словарь SymSpell (app/spell.py),
+а если он не собран — асинхронный клиент сервиса опечаток.
+Пул соединений aiohttp, жёсткий таймаут на вызов, LRU уже исправленных
+запросов и circuit breaker: пока сервис падает, вызовы пропускаются
+и возвращается исходный текст.
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Optional
+
+import aiohttp
+
 from app.config import settings
+from app.logger_config import setup_logger
+from app.spell import get_spell_dictionary
+from app.deadline import current_deadline
+
+logger = setup_logger("typo_client")
+
+
+class CircuitBreaker:
+    """closed → (failure_threshold ошибок подряд) → open → (reset_timeout) → half-open"""
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.trial_in_progress = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half-open" and not self.trial_in_progress:
+            # В half-open пропускаем ровно один пробный вызов
+            self.trial_in_progress = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_progress = False
+
+    def record_failure(self):
+        self.failures += 1
+        self.trial_in_progress = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+
+class TypoClient:
+    def __init__(self, url: str, timeout: float, cache_size: int, pool_size: int, breaker: CircuitBreaker):
+        self.url = url
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.cache_size = cache_size
+        self.pool_size = pool_size
+        self.breaker = breaker
+        self._cache: OrderedDict[str, str] = OrderedDict()
+        self._session: Optional[aiohttp.ClientSession] = None
+        self.calls = 0
+        self.cache_hits = 0
+        self.skipped = 0
+        self.errors = 0
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        # Сессия создаётся лениво: ей нужен запущенный event loop
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.pool_size),
+                timeout=self.timeout
+            )
+        return self._session
+
+    async def fix(self, text: str) -> str:
+        self.calls += 1
+        if text in self._cache:
+            self._cache.move_to_end(text)
+            self.cache_hits += 1
+            return self._cache[text]
+
+        # Таймаут вызова не больше остатка бюджета запроса
+        timeout = self.timeout
+        deadline = current_deadline.get()
+        if deadline is not None:
+            if deadline.expired:
+                self.skipped += 1
+                return text
+            timeout = aiohttp.ClientTimeout(total=deadline.stage_timeout(cap=self.timeout.total))
+
+        if not self.breaker.allow():
+            self.skipped += 1
+            return text
+
+        try:
+            async with self._get_session().post(self.url, json={"text": text}, timeout=timeout) as response:
+                response.raise_for_status()
+                corrected = (await response.json()).get("corrected", text)
+        except asyncio.TimeoutError:
+            # Таймаут, урезанный бюджетом запроса, — не признак нездоровья сервиса
+            if timeout.total >= self.timeout.total:
+                self.errors += 1
+                self.breaker.record_failure()
+            logger.warning(f"[Typo Fixer] Timeout after {timeout.total:.3f}s")
+            return text
+        except Exception as e:
+            self.errors += 1
+            self.breaker.record_failure()
+            logger.warning(f"[Typo Fixer] Error: {type(e).__name__} {e}")
+            return text
+        finally:
+            # Пробный вызов завершён любым исходом, включая отмену, —
+            # иначе half-open навсегда перестанет пропускать запросы
+            self.breaker.trial_in_progress = False
+
+        self.breaker.record_success()
+        self._cache[text] = corrected
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return corrected
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "cache_hits": self.cache_hits,
+            "cache_size": len(self._cache),
+            "skipped_by_breaker": self.skipped,
+            "errors": self.errors,
+            "breaker_state": self.breaker.state,
+        }
+
+
+typo_client = TypoClient(
+    url=settings.typo_api_url,
+    timeout=settings.typo_timeout,
+    cache_size=settings.typo_cache_size,
+    pool_size=settings.typo_pool_size,
+    breaker=CircuitBreaker(
+        failure_threshold=settings.typo_breaker_failures,
+        reset_timeout=settings.typo_breaker_reset
+    )
+)
 
 
-def fix_typo(text: str) -> str:
-    try:
-        response = requests.post(settings.typo_api_url, json={"text": text})
-        response.raise_for_status()
-        return response.json().get("corrected", text)
-    except Exception as e:
-        print(f"[Typo Fixer] Error: {e}")
-        return text
\ No newline at end of file
+async def fix_typo(text: str) -> str:
+    # Встроенный словарь: без сетевого запроса и одинаково во всех воркерах
+    spell_dictionary = get_spell_dictionary()
+    if spell_dictionary is not None:
+        return spell_dictionary.correct(text)
+    return await typo_client.fix(text)
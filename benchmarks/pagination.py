@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Проверка курсорной пагинации /search на фейковом кластере без OpenSearch.
+Кластер отдаёт страницы одного отсортированного списка по search_after
+(скор по убыванию, затем _doc, скоры с повторами), часть ответов не успевает
+к сроку или приходит с timed_out. Листание идёт тем же протоколом, что
+fetch_hits_page: paginate_body → ответ → next_page → encode/decode курсора.
+Проверяется, что каждая книга показана ровно один раз, страница не длиннее
+page_size, а курсор не растёт с глубиной.
+Использование: python -m benchmarks.pagination
+"""
+
+import random
+
+from app.pagination import SearchCursor, decode_cursor, encode_cursor, next_page, paginate_body
+
+FINGERPRINT = "fp"
+
+
+class FakeCluster:
+    """Один индекс в PIT: хиты упорядочены как PAGINATION_SORT"""
+
+    def __init__(self, n_books: int, seed: int, drop_rate: float, timed_out_rate: float):
+        rng = random.Random(seed)
+        # Скоры округлены: одинаковые скоры разводит только _doc
+        scored = [(round(rng.uniform(1, 50)), doc) for doc in range(n_books)]
+        self.hits = sorted(scored, key=lambda item: (-item[0], item[1]))
+        self.rng = rng
+        self.drop_rate = drop_rate
+        self.timed_out_rate = timed_out_rate
+
+    def search(self, body: dict):
+        """Ответ на страницу; None — не успел к сроку (его нет в run_queries)"""
+        if self.rng.random() < self.drop_rate:
+            return None
+        after = body.get("search_after")
+        start = 0
+        if after is not None:
+            start = next((i for i, (score, doc) in enumerate(self.hits) if (-score, doc) > (-after[0], after[1])),
+                         len(self.hits))
+        page = self.hits[start:start + body["size"]]
+        timed_out = self.rng.random() < self.timed_out_rate
+        if timed_out:
+            # неполный ответ: часть шардов не ответила
+            page = page[::2]
+        return {
+            "timed_out": timed_out,
+            "pit_id": body["pit"]["id"],
+            "hits": {
+                "total": {"value": len(self.hits), "relation": "eq"},
+                "hits": [{"_id": str(doc), "_score": score, "sort": [score, doc]} for score, doc in page]
+            }
+        }
+
+
+def run(n_books: int, page_size: int, seed: int, drop_rate: float = 0.0, timed_out_rate: float = 0.0) -> dict:
+    cluster = FakeCluster(n_books, seed, drop_rate, timed_out_rate)
+    cursor = SearchCursor(pit_id="pit", request_fingerprint=FINGERPRINT)
+    shown, pages, cursor_sizes = [], 0, []
+    while True:
+        body = paginate_body({"size": page_size}, cursor.pit_id, "1m", cursor.search_after)
+        hits, next_cursor = next_page(cursor, cluster.search(body), page_size)
+        assert len(hits) <= page_size, "страница длиннее page_size"
+        shown += [hit["_id"] for hit in hits]
+        pages += 1
+        if next_cursor is None:
+            break
+        token = encode_cursor(next_cursor)
+        cursor_sizes.append(len(token))
+        cursor = decode_cursor(token, FINGERPRINT)
+        assert pages < 10 * n_books, "листание не сходится"
+
+    assert len(shown) == len(set(shown)), "книга показана дважды"
+    assert set(shown) == {str(doc) for doc in range(n_books)}, "книга потеряна"
+    return {"pages": pages, "max_cursor": max(cursor_sizes, default=0)}
+
+
+def main():
+    for n_books in (35, 260, 2000):
+        for page_size in (5, 20):
+            for drop_rate, timed_out_rate in ((0.0, 0.0), (0.3, 0.1)):
+                stats = [run(n_books, page_size, seed, drop_rate, timed_out_rate) for seed in range(5)]
+                print(f"books={n_books:5d} page_size={page_size:3d} drop={drop_rate:.1f} timed_out={timed_out_rate:.1f}  "
+                      f"pages={max(s['pages'] for s in stats):4d}  cursor≤{max(s['max_cursor'] for s in stats)} B  ok")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк постпроцесса: полная сборка записи для каждого кандидата
+(postprocess_hits, затем отбор) против ленивого конвейера rank_hits —
+скоринг по минимальным полям, отбор top-K с diversity и сборка записей
+только для попавших в выдачу.
+Использование: python -m benchmarks.postprocess
+"""
+
+import random
+import timeit
+
+from app.postprocess_hits import postprocess_hits, score_candidates, materialize
+from app.ranking import merge_candidates, select_top, MAX_PER_TYPE
+
+PATH_INDEXES = [f"collection-{i}" for i in range(12)]
+
+
+def synthetic_hits(n: int, seed: int = 7) -> tuple[list[dict], list[dict]]:
+    """Хиты, похожие на ответы flat/nested: подсветка, inner_hits со сниппетами, страницы"""
+    rng = random.Random(seed)
+
+    def hit(i, nested):
+        source = {
+            "title": f"Книга {i}", "book_name": f"Издание {i}", "description": "",
+            "referat": "Аннотация " * 20, "book_year": 1900, "path_index": rng.choice(PATH_INDEXES),
+            "book_id": i, "pages": [{"book_page": p, "book_page_image": f"{i}/{p}.jpg"} for p in range(1, 4)],
+        }
+        result = {"_id": str(i), "_score": rng.uniform(1, 400), "_source": source,
+                  "highlight": {"title": ["<em>Слово</em> о <em>полку</em> Игореве"], "book_name": ["<em>Слово</em>"]}}
+        if nested:
+            result["inner_hits"] = {"matched_pages": {"hits": {"hits": [
+                {"_source": {"book_page": p, "book_page_image": f"{i}/{p}.jpg", "book_page_text": "текст " * 100},
+                 "highlight": {"pages.book_page_text": ["...<em>слово</em> о полку..."]}}
+                for p in range(rng.randint(1, 3))
+            ]}}}
+        return result
+
+    return [hit(i, False) for i in range(n // 2)], [hit(i, True) for i in range(n // 3, n // 3 + n // 2)]
+
+
+def eager(flat, nested):
+    results = postprocess_hits({"hits": {"hits": merge_candidates(flat, nested)}})
+    return select_top(results, max_per_type=MAX_PER_TYPE)
+
+
+def lazy(flat, nested):
+    top = select_top(score_candidates(merge_candidates(flat, nested)), max_per_type=MAX_PER_TYPE)
+    return [materialize(candidate) for candidate in top]
+
+
+def report(n: int, number: int):
+    flat, nested = synthetic_hits(n)
+    assert eager(flat, nested) == lazy(flat, nested)
+    eager_ms = timeit.timeit(lambda: eager(flat, nested), number=number) / number * 1e3
+    lazy_ms = timeit.timeit(lambda: lazy(flat, nested), number=number) / number * 1e3
+    print(f"{n:>5} кандидатов, в выдаче {len(lazy(flat, nested)):>3}: "
+          f"все записи {eager_ms:6.3f} мс  лениво {lazy_ms:6.3f} мс (×{eager_ms / lazy_ms:.1f})")
+
+
+if __name__ == "__main__":
+    report(100, number=2000)
+    report(1_000, number=200)
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Микробенчмарк вариантов запроса: старая реализация (словари собираются
+на каждый вызов, перевод посимвольно) против скомпилированных таблиц
+app/query_understanding.py — без кэша и с LRU.
+Использование: python -m benchmarks.query_variants
+"""
+
+import timeit
+
+from app.query_understanding import (
+    ENG_KEYS, RUS_KEYS, ENG_TO_RUS, RUS_ALPHABET, RUS_TO_ENG,
+    local_changer, query_variants, query_variants_batch, transliterate, _variants,
+)
+
+QUERIES = [
+    "Московское метро",
+    "Слово о полку Игореве",
+    "Искусство палеха",
+    "Vjcrjdcrjt vtnhj",
+    "palekh",
+    "Архитектурные памятники Москвы",
+    "Маяковский открытка",
+    "Первая станция московского метро",
+]
+
+
+# --- старая реализация (как в app/utils.py до компиляции таблиц) ---
+
+def legacy_is_rus_language(phrase):
+    rus_alphabet = set(RUS_ALPHABET)
+    return all(char in rus_alphabet for char in phrase.lower())
+
+
+def legacy_transliterate(query):
+    rus_to_eng_layout = dict(RUS_TO_ENG)
+    eng_to_rus_layout = dict(ENG_TO_RUS)
+    layout = rus_to_eng_layout if legacy_is_rus_language(query) else eng_to_rus_layout
+    return "".join(layout.get(char, char) for char in query.lower())
+
+
+def legacy_local_changer(query):
+    layout = dict(zip(map(ord, ENG_KEYS), RUS_KEYS, strict=False))
+    return query.translate(layout)
+
+
+def bench(name, fn, number=20000):
+    total = timeit.timeit(lambda: [fn(q) for q in QUERIES], number=number)
+    per_query = total / (number * len(QUERIES)) * 1e6
+    print(f"{name:<40} {per_query:8.3f} мкс/запрос")
+    return per_query
+
+
+if __name__ == "__main__":
+    for q in QUERIES:
+        assert legacy_transliterate(q) == transliterate(q), q
+        assert legacy_local_changer(q) == local_changer(q), q
+
+    before = bench("до: transliterate + local_changer", lambda q: (legacy_transliterate(q), legacy_local_changer(q)))
+    compiled = bench("после: скомпилированные таблицы", lambda q: (transliterate(q), local_changer(q)))
+    _variants.cache_clear()
+    cached = bench("после: query_variants (LRU)", query_variants)
+    batch = timeit.timeit(lambda: query_variants_batch(QUERIES * 10), number=2000) / (2000 * len(QUERIES) * 10) * 1e6
+    print(f"{'после: query_variants_batch':<40} {batch:8.3f} мкс/запрос")
+    print(f"\nУскорение: таблицы ×{before / compiled:.1f}, с кэшем ×{before / cached:.1f}")
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк стадии ранжирования на синтетических хитах (1k и 10k):
+прежний конвейер (сортировка в merge_hits → сортировка в postprocess_hits →
+группировка и сортировка в apply_diversity) против merge_candidates +
+select_top из app/ranking.py. Постпроцесс одинаков в обоих вариантах
+и вынесен за скобки: меряется только слияние, сортировки и отбор.
+Использование: python -m benchmarks.ranking
+"""
+
+import copy
+import random
+import timeit
+from collections import defaultdict
+
+from app.ranking import merge_candidates, select_top, MAX_PER_TYPE
+
+PATH_INDEXES = [f"collection-{i}" for i in range(40)]
+
+
+def synthetic_hits(n: int, seed: int = 42) -> tuple[list[dict], list[dict]]:
+    """flat и nested хиты с пересечением по _id примерно на треть"""
+    rng = random.Random(seed)
+
+    def hit(i):
+        return {"_id": str(i), "_score": rng.uniform(1, 400),
+                "_source": {"path_index": rng.choice(PATH_INDEXES)}}
+
+    flat = [hit(i) for i in range(n // 2)]
+    nested = [hit(i) for i in range(n // 3, n // 3 + n // 2)]
+    return flat, nested
+
+
+def to_results(hits: list[dict]) -> list[dict]:
+    # минимальный результат постпроцесса: итоговый score и path_index
+    return [{"id": h["_id"], "score": h["_score"], "path_index": h["_source"]["path_index"]} for h in hits]
+
+
+# --- прежний конвейер (app/main.py merge_hits + postprocess_hits + apply_diversity) ---
+
+def legacy_merge_hits(flat_hits, nested_hits):
+    combined = {}
+    for hit in flat_hits:
+        combined[hit["_id"]] = {"hit": hit, "from_flat": True, "from_nested": False}
+    for hit in nested_hits:
+        if hit["_id"] in combined:
+            combined[hit["_id"]]["from_nested"] = True
+            combined[hit["_id"]]["hit"]["inner_hits"] = hit.get("inner_hits")
+        else:
+            combined[hit["_id"]] = {"hit": hit, "from_flat": False, "from_nested": True}
+
+    merged = []
+    for meta in combined.values():
+        hit = meta["hit"]
+        if meta["from_flat"] and meta["from_nested"]:
+            hit["_source"]["matched_by"] = "both"
+        elif meta["from_nested"]:
+            hit["_source"]["matched_by"] = "nested"
+        else:
+            hit["_source"]["matched_by"] = "flat"
+        merged.append(hit)
+
+    def scoring_key(hit):
+        mb = hit["_source"].get("matched_by", "")
+        score = hit.get("_score", 0)
+        if mb == "nested":
+            return score * 1.4
+        if mb == "both":
+            return score * 1.6
+        return score * 1.2 if score > 200 else score * 0.9
+
+    return sorted(merged, key=scoring_key, reverse=True)
+
+
+def legacy_apply_diversity(results, max_per_type):
+    grouped = defaultdict(list)
+    for hit in results:
+        grouped[hit.get("path_index", "unknown")].append(hit)
+    diverse_results = []
+    for hits in grouped.values():
+        diverse_results.extend(hits[:max_per_type])
+    return sorted(diverse_results, key=lambda x: x["score"], reverse=True)
+
+
+def legacy_rank(flat, nested):
+    results = to_results(legacy_merge_hits(flat, nested))
+    results = sorted(results, key=lambda x: x["score"], reverse=True)
+    return legacy_apply_diversity(results, MAX_PER_TYPE)
+
+
+def single_pass_rank(flat, nested, k=None):
+    return select_top(to_results(merge_candidates(flat, nested)), max_per_type=MAX_PER_TYPE, k=k)
+
+
+def report(n: int, number: int):
+    flat, nested = synthetic_hits(n)
+    # одинаковый результат при k=None
+    assert [r["id"] for r in legacy_rank(copy.deepcopy(flat), copy.deepcopy(nested))] == \
+           [r["id"] for r in single_pass_rank(copy.deepcopy(flat), copy.deepcopy(nested))]
+
+    legacy = timeit.timeit(lambda: legacy_rank(flat, nested), number=number) / number * 1e3
+    single = timeit.timeit(lambda: single_pass_rank(flat, nested), number=number) / number * 1e3
+    top_k = timeit.timeit(lambda: single_pass_rank(flat, nested, k=50), number=number) / number * 1e3
+    print(f"{n:>6} хитов: прежний {legacy:7.3f} мс  один проход {single:7.3f} мс (×{legacy / single:.1f})  "
+          f"top-50 {top_k:7.3f} мс (×{legacy / top_k:.1f})")
+
+
+if __name__ == "__main__":
+    report(1_000, number=300)
+    report(10_000, number=30)
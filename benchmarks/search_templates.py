@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк inline-тел против хранимых search templates:
+байты запроса и CPU клиента на один поиск (flat + nested),
+включая сборку тела и сериализацию в JSON, как это делает клиент.
+Использование: python -m benchmarks.search_templates
+"""
+
+import json
+import timeit
+
+from app.build_query import build_flat_query, build_nested_query
+
+QUERY_LIST = ["Слово о полку Игореве", "слово о полку игореве"]
+START_YEAR, END_YEAR = 1800, 1950
+
+
+def inline_bodies():
+    return [
+        json.dumps(build_flat_query(QUERY_LIST, START_YEAR, END_YEAR), ensure_ascii=False),
+        json.dumps(build_nested_query(QUERY_LIST, START_YEAR, END_YEAR), ensure_ascii=False),
+    ]
+
+
+def template_bodies():
+    # То же, что уходит через SearchTemplates.request
+    params = {"query": " ".join(QUERY_LIST), "size": 50, "start_year": START_YEAR, "end_year": END_YEAR}
+    return [
+        json.dumps({"id": "necrasovka-flat-years-0123456789ab", "params": params}, ensure_ascii=False),
+        json.dumps({"id": "necrasovka-nested-years-0123456789ab", "params": params}, ensure_ascii=False),
+    ]
+
+
+def report(name, fn, number=5000):
+    size = sum(len(body.encode("utf-8")) for body in fn())
+    per_search = timeit.timeit(fn, number=number) / number * 1e6
+    print(f"{name:<12} {size:6d} байт/поиск  {per_search:8.1f} мкс CPU/поиск")
+    return size, per_search
+
+
+if __name__ == "__main__":
+    inline_size, inline_cpu = report("inline", inline_bodies)
+    template_size, template_cpu = report("templates", template_bodies)
+    print(f"\nБайты: ×{inline_size / template_size:.1f} меньше, CPU: ×{inline_cpu / template_cpu:.1f} меньше")
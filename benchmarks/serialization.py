@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк сериализации ответа /search: прежний словарь с highlight_fields
+через стандартный json (как JSONResponse после jsonable_encoder) против
+SearchResult — целиком и с проекцией fields=, которую рендерит фронтенд.
+orjson меряется, если установлен.
+Использование: python -m benchmarks.serialization
+"""
+
+import gzip
+import json
+import timeit
+
+from app.result_model import SearchResult, parse_fields, project
+
+# Поля, которые читает frontend/frontend-necrasovka/src/App.jsx
+FRONTEND_FIELDS = "id,score,matched_by,title,description,book_year,lang,filter_name,path_index,matched_pages,cover_page"
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def synthetic_results(n: int = 50) -> list[SearchResult]:
+    return [
+        SearchResult(
+            id=str(i), score=100.0 + i, matched_by="both",
+            title=f"Слово о полку Игореве. Издание {i}", book_name="Слово о полку Игореве",
+            description="Аннотация к изданию " * 15, book_year=1900 + i, lang="rus",
+            filter_name="Книги", path_index="books", pdf_url=f"https://example/{i}.pdf",
+            highlight={"title": ["<em>Слово</em> о <em>полку</em> Игореве"], "book_name": ["<em>Слово</em>"]},
+            matched_pages=[{"page": p, "image": f"{i}/{p}.jpg", "snippet": "…<em>слово</em> о полку… " * 6} for p in range(3)],
+            cover_page={"page": 1, "image": f"{i}/1.jpg"}, page_count=120, book_code=f"code-{i}", book_id=i,
+            url=f"https://api.electro.nekrasovka.ru/api/books/{i}/pages/1/img/medium",
+        )
+        for i in range(n)
+    ]
+
+
+def legacy_dict(result: SearchResult) -> dict:
+    # прежний build_result: те же поля + highlight_fields
+    return {**result.to_dict(), "highlight_fields": list(result.highlight.keys())}
+
+
+def stdlib_dumps(value) -> bytes:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"),
+                      default=lambda v: v.to_dict()).encode("utf-8")
+
+
+def report(name: str, fn, number: int = 2000):
+    body = fn()
+    per_call = timeit.timeit(fn, number=number) / number * 1e3
+    print(f"{name:<28} {len(body):7d} байт  gzip {len(gzip.compress(body)):6d} байт  {per_call:6.3f} мс")
+
+
+if __name__ == "__main__":
+    results = synthetic_results()
+    legacy = {"original_query": "слово о полку", "results": [legacy_dict(r) for r in results]}
+    compact = {"original_query": "слово о полку", "results": results}
+    projected = project(compact, parse_fields(FRONTEND_FIELDS))
+
+    # JSONResponse по умолчанию: json.dumps(ensure_ascii=False, indent=None)
+    report("прежний dict + json", lambda: json.dumps(legacy, ensure_ascii=False).encode("utf-8"))
+    report("SearchResult + json", lambda: stdlib_dumps(compact))
+    report("fields= + json", lambda: stdlib_dumps(project(compact, parse_fields(FRONTEND_FIELDS))))
+    if orjson is not None:
+        report("SearchResult + orjson", lambda: orjson.dumps(compact))
+        report("fields= + orjson", lambda: orjson.dumps(project(compact, parse_fields(FRONTEND_FIELDS))))
+    else:
+        print("orjson не установлен — быстрый путь не измерен")
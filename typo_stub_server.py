@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Локальная заглушка сервиса опечаток для проверки typo_client
+(таймауты, circuit breaker, кэш) без настоящего typo-fixer.
+Использование: python typo_stub_server.py [--port 8001] [--delay 0.5] [--fail-rate 0.3]
+Затем: TYPO_API_URL=http://localhost:8001/fix
+"""
+
+import argparse
+import json
+import random
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CORRECTIONS = {
+    "масковское метро": "московское метро",
+    "палхе": "палех",
+    "игорееве": "игореве",
+}
+
+
+def make_handler(delay: float, fail_rate: float):
+    class TypoStubHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            text = json.loads(self.rfile.read(length) or b"{}").get("text", "")
+
+            if delay:
+                time.sleep(delay)
+            if random.random() < fail_rate:
+                self.send_response(503)
+                self.end_headers()
+                return
+
+            body = json.dumps({"corrected": CORRECTIONS.get(text.lower(), text)}, ensure_ascii=False).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    return TypoStubHandler
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--delay", type=float, default=0.0, help="задержка ответа, сек")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="доля ответов 503")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("0.0.0.0", args.port), make_handler(args.delay, args.fail_rate))
+    print(f"🧪 Typo stub на http://localhost:{args.port}/fix (delay={args.delay}, fail_rate={args.fail_rate})")
+    server.serve_forever()